@@ -0,0 +1,258 @@
+"""
+Adaptive Polling
+
+Learns when each SKU tends to restock from recorded check results and
+turns that into a per-product check interval. History is keyed by SKU (or by
+URL for products without one), so renaming a product keeps its history and
+pointing it at a different SKU starts over. Hours of the week in which
+restocks have happened before are polled hard, hours that have never seen a
+restock are backed off, and the combined request rate against each host is
+kept inside a budget. The budget is a token bucket per host, so checks saved
+during dead hours pay for polling faster around likely restocks.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+from urllib.parse import urlparse
+
+logger = logging.getLogger("stock_scanner")
+
+HOURS_PER_WEEK = 24 * 7
+SECONDS_PER_DAY = 24 * 60 * 60
+
+__all__ = ['AdaptivePoller']
+
+
+def _hour_of_week(timestamp):
+    """Return the local hour-of-week bucket (0-167, Monday 00:00 is 0) for a timestamp"""
+    moment = datetime.fromtimestamp(timestamp)
+    return moment.weekday() * 24 + moment.hour
+
+
+def _host_of(url):
+    """Return the host a product URL is polled against"""
+    return urlparse(url).netloc.lower()
+
+
+class AdaptivePoller:
+    """
+    Per-product check interval engine driven by restock history.
+
+    Products are identified by a key: their SKU, or their URL if they have none.
+
+    Call load() to pick up the history persisted by earlier runs.
+
+    Args:
+        history_file (str): JSON file the restock history is persisted to (None to keep it in memory)
+        default_delay (float): Interval used when nothing is known about a product
+        instock_delay (float): Interval used while a product is in stock
+        min_delay (float): Shortest interval used around a likely restock window
+        max_delay (float): Longest interval used during dead hours
+        host_budget (float): Average requests per minute against a single host. None allows
+            what the host's products would cost at default_delay, 0 disables the budget
+        budget_window (float): Seconds of unused budget a host can save up for busy hours
+        half_life_days (float): Age at which a past restock counts for half as much
+        history_days (float): Restocks older than this are forgotten
+        volatility_window (float): Seconds of recent transitions that count as volatility
+        lookahead (float): Seconds ahead of now that are treated as part of the current window
+    """
+
+    def __init__(self, history_file=None, default_delay=30, instock_delay=5, min_delay=10,
+                 max_delay=120, host_budget=None, half_life_days=14, history_days=56,
+                 volatility_window=6 * 60 * 60, lookahead=15 * 60, budget_window=6 * 60 * 60):
+        self.history_file = history_file
+        self.default_delay = default_delay
+        self.instock_delay = instock_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.host_budget = host_budget
+        self.half_life = half_life_days * SECONDS_PER_DAY
+        self.history_window = history_days * SECONDS_PER_DAY
+        self.volatility_window = volatility_window
+        self.lookahead = lookahead
+        self.budget_window = budget_window
+
+        # key -> {'restocks': [ts, ...], 'transitions': [ts, ...], 'in_stock': bool}
+        self.history = {}
+        # key -> (host, desired delay, in_stock) of the most recently scheduled interval
+        self._scheduled = {}
+        # key -> (computed_at, weekly, hourly) bucket weights
+        self._profiles = {}
+        # host -> [saved requests, updated_at]
+        self._buckets = {}
+
+    def load(self):
+        """Load the restock history from disk if a history file is configured"""
+        if not self.history_file or not os.path.exists(self.history_file):
+            return
+        try:
+            with open(self.history_file, 'r') as f:
+                self.history = json.load(f)
+            logger.info(f"Loaded restock history for {len(self.history)} SKUs from {self.history_file}")
+        except Exception as e:
+            logger.error(f"Error loading restock history: {e}")
+            self.history = {}
+
+    def save(self):
+        """Persist the restock history to disk if a history file is configured"""
+        if not self.history_file:
+            return
+        try:
+            with open(self.history_file, 'w') as f:
+                json.dump(self.history, f)
+        except Exception as e:
+            logger.error(f"Error saving restock history: {e}")
+
+    def record(self, key, in_stock, timestamp):
+        """
+        Record the result of a successful check.
+
+        Args:
+            key (str): SKU (or URL) of the product that was checked
+            in_stock (bool): Whether the product was in stock
+            timestamp (float): Epoch seconds the check completed at
+        """
+        entry = self.history.get(key)
+        if entry is None:
+            # The first observation only tells us the current state, not when it changed
+            self.history[key] = {'restocks': [], 'transitions': [], 'in_stock': bool(in_stock)}
+            return
+        if bool(in_stock) == entry['in_stock']:
+            return
+
+        entry['in_stock'] = bool(in_stock)
+        entry['transitions'].append(timestamp)
+        if in_stock:
+            entry['restocks'].append(timestamp)
+
+        cutoff = timestamp - self.history_window
+        entry['restocks'] = [t for t in entry['restocks'] if t >= cutoff]
+        entry['transitions'] = [t for t in entry['transitions'] if t >= timestamp - self.volatility_window]
+        self._profiles.pop(key, None)
+        self.save()
+
+    def forget(self, key):
+        """Drop scheduling state for a SKU that is no longer tracked (its history is kept)"""
+        self._scheduled.pop(key, None)
+        self._profiles.pop(key, None)
+
+    def _profile(self, key, now):
+        """Return decayed restock weights per hour-of-week and per hour-of-day for a product"""
+        cached = self._profiles.get(key)
+        # Decay changes slowly, so an hour-old profile is still accurate enough
+        if cached and now - cached[0] < 3600:
+            return cached[1], cached[2]
+
+        weekly = [0.0] * HOURS_PER_WEEK
+        hourly = [0.0] * 24
+        for restock in self.history.get(key, {}).get('restocks', []):
+            age = max(0.0, now - restock)
+            if age > self.history_window:
+                continue
+            weight = 0.5 ** (age / self.half_life)
+            bucket = _hour_of_week(restock)
+            weekly[bucket] += weight
+            hourly[bucket % 24] += weight
+
+        self._profiles[key] = (now, weekly, hourly)
+        return weekly, hourly
+
+    def restock_likelihood(self, key, now):
+        """
+        Return how much more likely a restock is right now than in an average hour.
+
+        1.0 means no information (or an average hour), values above 1.0 mark a
+        likely drop window and values below 1.0 mark dead hours.
+        """
+        weekly, hourly = self._profile(key, now)
+        total = sum(weekly)
+        if total == 0:
+            return 1.0
+
+        def score(timestamp):
+            bucket = _hour_of_week(timestamp)
+            neighbours = weekly[(bucket - 1) % HOURS_PER_WEEK] + weekly[(bucket + 1) % HOURS_PER_WEEK]
+            # Same weekday/hour counts most, neighbouring hours and the same hour on other days fill in sparse history
+            return weekly[bucket] + 0.5 * neighbours + hourly[bucket % 24] / 7
+
+        # Every restock contributes 1 + 2 * 0.5 + 7 * (1/7) = 3 weight units, spread over the week
+        mean = 3 * total / HOURS_PER_WEEK
+        # A pseudo-count of one restock keeps sparse history from swinging the interval to an extreme
+        prior = 3.0 / HOURS_PER_WEEK
+        current = max(score(now), score(now + self.lookahead))
+        return (current + prior) / (mean + prior)
+
+    def volatility(self, key, now):
+        """Return the number of stock transitions within the volatility window"""
+        transitions = self.history.get(key, {}).get('transitions', [])
+        return sum(1 for t in transitions if now - t <= self.volatility_window)
+
+    def desired_delay(self, key, in_stock, now):
+        """Return the interval a product would get without any host budget"""
+        if in_stock:
+            return self.instock_delay
+        intensity = self.restock_likelihood(key, now) * (1 + self.volatility(key, now))
+        return max(self.min_delay, min(self.max_delay, self.default_delay / intensity))
+
+    def next_delay(self, key, url, in_stock, now):
+        """
+        Return the interval until the next check of a product.
+
+        Every check spends one request from its host's bucket, which refills at
+        the budget rate and holds up to budget_window worth of requests.
+        While the bucket has requests saved up, out-of-stock products get their
+        desired interval even if it is faster than the budget rate; once it
+        is empty they are stretched proportionally to fit the rate. In-stock
+        products always keep their interval and are only charged what they
+        would cost at default_delay, so with the derived budget out-of-stock
+        products are never slowed down because others are in stock.
+
+        Args:
+            key (str): SKU (or URL) of the product that was just checked
+            url (str): Product URL, used to find the host it is polled against
+            in_stock (bool): Current stock status of the product
+            now (float): Epoch seconds to compute the interval for
+
+        Returns:
+            float: Seconds until the next check
+        """
+        host = _host_of(url)
+        delay = self.desired_delay(key, in_stock, now)
+        self._scheduled[key] = (host, delay, in_stock)
+
+        if self.host_budget == 0:
+            return delay
+
+        products = 0
+        reserved = 0.0
+        flexible = 0.0
+        for scheduled_host, scheduled_delay, scheduled_in_stock in self._scheduled.values():
+            if scheduled_host != host:
+                continue
+            products += 1
+            if scheduled_in_stock:
+                reserved += min(1.0 / scheduled_delay, 1.0 / self.default_delay)
+            else:
+                flexible += 1.0 / scheduled_delay
+
+        if self.host_budget is None:
+            # The same request volume fixed delays would cost, just spent where restocks are likely
+            budget = products / self.default_delay
+        else:
+            budget = self.host_budget / 60.0
+
+        capacity = budget * self.budget_window
+        bucket = self._buckets.setdefault(host, [capacity, now])
+        bucket[0] = min(capacity, bucket[0] + budget * max(0.0, now - bucket[1]))
+        bucket[1] = now
+        bucket[0] -= min(1.0, delay / self.default_delay) if in_stock else 1.0
+
+        if in_stock or bucket[0] > 0:
+            return delay
+
+        # Never starve out-of-stock products entirely, even if in-stock ones use up the budget
+        available = max(budget - reserved, budget * 0.25)
+        if flexible > available:
+            delay *= flexible / available
+        return delay
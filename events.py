@@ -0,0 +1,203 @@
+"""
+Stock Event Stream
+
+Publishes stock transitions to local consumers. The scanner hands every
+event to an in-memory broadcaster, which copies it into one bounded queue
+per subscriber without ever waiting: when a consumer falls behind, its
+oldest undelivered events are dropped, so a slow or stuck client cannot
+hold up the scanning loop.
+
+The optional server exposes the broadcaster over HTTP (aiohttp is only
+imported when it starts):
+    GET /events  Server-Sent Events, starting with a status snapshot
+    GET /ws      The same stream as WebSocket JSON messages
+    GET /status  Current status of every product as JSON
+"""
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger("stock_scanner")
+
+HEARTBEAT_INTERVAL = 15  # Seconds between keep-alives on idle connections
+
+__all__ = ['EventBroadcaster', 'EventServer']
+
+
+class Subscription:
+    """
+    One consumer's bounded queue of events.
+
+    Args:
+        queue_size (int): Undelivered events kept before the oldest are dropped
+    """
+
+    def __init__(self, queue_size):
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def _put(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next event.
+
+        Returns:
+            dict: The event, or None on timeout or once the broadcaster is closed
+        """
+        if self.closed and self._queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroadcaster:
+    """
+    Fans events out to any number of subscribers.
+
+    Args:
+        queue_size (int): Per-subscriber queue length
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.published = 0
+
+    def subscribe(self):
+        """Return a new Subscription that receives every event published from now on"""
+        subscription = Subscription(self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+        if subscription.dropped:
+            logger.warning(f"Event subscriber fell behind and missed {subscription.dropped} events")
+
+    def publish(self, event):
+        """Queue an event for every subscriber without blocking"""
+        self.published += 1
+        event = dict(event, id=self.published)
+        for subscription in self.subscribers:
+            subscription._put(event)
+
+    def close(self):
+        """Wake every subscriber so it can finish once its queue is drained"""
+        for subscription in self.subscribers:
+            subscription.closed = True
+            subscription._put(None)
+
+
+def _sse(event_type, data, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{lines}event: {event_type}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+class EventServer:
+    """
+    Local HTTP server for the event stream.
+
+    Args:
+        broadcaster (EventBroadcaster): Source of the events
+        snapshot: Callable returning the current status as a JSON-serialisable dict
+        host (str): Interface to listen on
+        port (int): Port to listen on
+    """
+
+    def __init__(self, broadcaster, snapshot, host='127.0.0.1', port=8765):
+        self.broadcaster = broadcaster
+        self.snapshot = snapshot
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        """Start listening"""
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get('/events', self._handle_sse)
+        app.router.add_get('/ws', self._handle_websocket)
+        app.router.add_get('/status', self._handle_status)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Event stream listening on http://{self.host}:{self.port}/events")
+
+    async def stop(self):
+        """Disconnect the subscribers and stop listening"""
+        if self._runner is None:
+            return
+        self.broadcaster.close()
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def _handle_status(self, request):
+        from aiohttp import web
+        return web.json_response(self.snapshot())
+
+    async def _handle_sse(self, request):
+        from aiohttp import web
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        await response.prepare(request)
+        subscription = self.broadcaster.subscribe()
+        try:
+            await response.write(_sse('snapshot', self.snapshot()))
+            while True:
+                event = await subscription.get(HEARTBEAT_INTERVAL)
+                if event is None:
+                    if subscription.closed:
+                        break
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                await response.write(_sse(event['type'], event, event['id']))
+        except ConnectionResetError:
+            pass  # Client went away
+        finally:
+            self.broadcaster.unsubscribe(subscription)
+        return response
+
+    async def _handle_websocket(self, request):
+        from aiohttp import web
+
+        ws = web.WebSocketResponse(heartbeat=HEARTBEAT_INTERVAL)
+        await ws.prepare(request)
+        subscription = self.broadcaster.subscribe()
+
+        async def send_events():
+            await ws.send_json({'type': 'snapshot', **self.snapshot()})
+            while not ws.closed:
+                event = await subscription.get(HEARTBEAT_INTERVAL)
+                if event is not None:
+                    await ws.send_json(event)
+                elif subscription.closed:
+                    break
+            await ws.close()
+
+        sender = asyncio.ensure_future(send_events())
+        try:
+            # Incoming messages are ignored; reading is what notices the client going away
+            async for _ in ws:
+                pass
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, ConnectionResetError):
+                pass
+            self.broadcaster.unsubscribe(subscription)
+            await ws.close()
+        return ws
@@ -0,0 +1,310 @@
+"""
+HTTP Fetcher
+
+Fetches product pages over a cookie-persisting aiohttp session with
+randomized, browser-like headers. aiohttp is only imported when the fetcher
+is opened, so constructing one is free.
+"""
+import asyncio
+import http.cookies
+import json
+import logging
+import os
+import random
+
+import ua_generator
+from tracing import NULL_TRACE
+
+logger = logging.getLogger("stock_scanner")
+
+FALLBACK_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.3 Safari/605.1.15"
+]
+
+__all__ = ['HttpFetcher', 'FetchResult']
+
+
+class FetchResult:
+    """Status, headers and raw body of a fetched page"""
+
+    def __init__(self, status, headers, body, charset=None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.charset = charset
+
+
+def extract_cookies_from_response(response):
+    """Extract cookies from response headers"""
+    cookies_dict = {}
+    if 'Set-Cookie' in response.headers:
+        for cookie_str in response.headers.getall('Set-Cookie', []):
+            cookie = http.cookies.SimpleCookie()
+            cookie.load(cookie_str)
+            for key, morsel in cookie.items():
+                cookies_dict[key] = morsel.value
+    return cookies_dict
+
+
+class HttpFetcher:
+    """
+    Product page fetcher.
+
+    Args:
+        config: Scanner configuration (see scanner.make_config)
+        session: Existing aiohttp-compatible session to use instead of creating one.
+            The fetcher does not close sessions it did not create.
+    """
+
+    def __init__(self, config, session=None):
+        self.config = config
+        self.session = session
+        self._owns_session = session is None
+        self.user_agents = None
+        self.header_templates = None
+
+    # User agents
+
+    def load_user_agents(self):
+        """Load user agents from file or generate them if needed"""
+        path = self.config.USER_AGENTS_FILE
+        try:
+            # Try to load from file first
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    agents = json.load(f)
+                    if agents and len(agents) >= self.config.UA_POOL_SIZE:
+                        logger.info(f"Loaded {len(agents)} user agents from {path}")
+                        return agents
+                    else:
+                        logger.info(f"Found user agents file but it contains insufficient agents ({len(agents) if agents else 0}), generating new pool")
+
+            # Generate a pool of user agents
+            agents = ua_generator.generate_user_agents(self.config.UA_POOL_SIZE, include_mobile=self.config.INCLUDE_MOBILE_UAS)
+            logger.info(f"Generated {len(agents)} user agents dynamically")
+
+            # Save to file for future use
+            self.save_user_agents(agents)
+
+            return agents
+        except Exception as e:
+            logger.error(f"Error with user agents: {e}")
+            # Fallback to a few basic user agents
+            logger.info("Using fallback user agents")
+            return list(FALLBACK_USER_AGENTS)
+
+    def save_user_agents(self, agents):
+        """Save user agents to a file for reuse"""
+        path = self.config.USER_AGENTS_FILE
+        try:
+            with open(path, 'w') as f:
+                json.dump(agents, f)
+            logger.info(f"Saved {len(agents)} user agents to {path}")
+        except Exception as e:
+            logger.error(f"Error saving user agents: {e}")
+
+    # Headers
+
+    def load_headers(self):
+        """Load header templates from the JSON file (raises if it is missing or invalid)"""
+        path = self.config.HEADERS_FILE
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Headers file {path} not found. This is required for the application to work.")
+        with open(path, 'r') as f:
+            headers = json.load(f)
+        logger.info(f"Loaded header templates from {path}")
+        return headers
+
+    def random_headers(self, header_type="common"):
+        """Generate headers with randomized values to appear more human-like"""
+        config = self.config
+        templates = self.header_templates
+
+        # Generate a fresh user agent or use one from the pool
+        if random.random() < config.FRESH_UA_CHANCE:  # Chance to use a freshly generated UA
+            user_agent = ua_generator.get_random_user_agent(include_mobile=config.INCLUDE_MOBILE_UAS)
+            # Add newly generated user agent to our pool occasionally
+            if len(self.user_agents) < config.UA_POOL_SIZE * 1.5:  # Limit growth of the pool
+                self.user_agents.append(user_agent)
+                # Periodically save back to file when we add new ones
+                if random.random() < 0.1:  # 10% chance to save on new addition
+                    self.save_user_agents(self.user_agents)
+        else:
+            # Use one from our pre-generated pool
+            user_agent = random.choice(self.user_agents)
+
+        # Get the base headers template
+        if header_type in templates:
+            headers = templates[header_type].copy()
+        else:
+            headers = templates["common"].copy()
+
+        # Add the user agent
+        headers["User-Agent"] = user_agent
+
+        # Only apply randomization if enabled in settings
+        if not config.RANDOMIZE_HEADERS:
+            return headers
+
+        # Get the randomization options
+        random_options = templates.get("random_options", {})
+
+        # Apply random values from options
+        for header, values in random_options.items():
+            if header == "optional_headers" or header == "sec-ch-ua-versions":
+                continue  # These are handled specially
+
+            if isinstance(values, list) and values:
+                headers[header] = random.choice(values)
+
+        # Apply optional headers (with randomized chance of inclusion)
+        optional_headers = random_options.get("optional_headers", {})
+        for header, values in optional_headers.items():
+            if random.random() > 0.3 and values:  # 70% chance to include optional header
+                headers[header] = random.choice(values)
+
+        # Apply browser-specific headers based on user agent
+        ua_versions = random_options.get("sec-ch-ua-versions", {})
+
+        # Chrome-specific headers
+        if "Chrome" in user_agent and "Firefox" not in user_agent and "Edg" not in user_agent:
+            if "Chrome" in ua_versions and ua_versions["Chrome"]:
+                version = random.choice(ua_versions["Chrome"])
+                headers["sec-ch-ua"] = f"\"Chromium\";v=\"{version}\", \"Google Chrome\";v=\"{version}\""
+
+        # Firefox-specific headers
+        elif "Firefox" in user_agent:
+            if random.random() > 0.3 and "TE" not in headers:  # 70% chance
+                headers["TE"] = "trailers"
+
+        # Edge-specific headers
+        elif "Edg" in user_agent:
+            if "Chrome" in ua_versions and ua_versions["Chrome"]:
+                version = random.choice(ua_versions["Chrome"])
+                headers["sec-ch-ua"] = f"\"Chromium\";v=\"{version}\", \"Microsoft Edge\";v=\"{version}\""
+
+        return headers
+
+    # Cookies
+
+    def save_cookies(self):
+        """Save the session's cookies to a file"""
+        try:
+            all_cookies = {cookie.key: cookie.value for cookie in self.session.cookie_jar}
+            with open(self.config.COOKIES_FILE, 'w') as f:
+                json.dump(all_cookies, f)
+        except Exception as e:
+            logger.error(f"Error saving cookies: {e}")
+
+    def load_cookies(self):
+        """Load cookies from a file"""
+        try:
+            if os.path.exists(self.config.COOKIES_FILE):
+                with open(self.config.COOKIES_FILE, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading cookies: {e}")
+        return {}
+
+    def update_session_cookies(self, new_cookies):
+        """Update session cookies with new values"""
+        if not new_cookies:
+            return
+        for name, value in new_cookies.items():
+            self.session.cookie_jar.update_cookies({name: value})
+
+    # Lifecycle
+
+    async def open(self, trace_configs=None):
+        """
+        Load user agents and header templates, create the session and warm it up.
+
+        Args:
+            trace_configs (list): aiohttp TraceConfigs for a session created here
+        """
+        self.user_agents = self.load_user_agents()
+        self.header_templates = self.load_headers()
+
+        if self.session is None:
+            import aiohttp
+            from yarl import URL
+
+            # Create a cookie jar from the saved cookies
+            jar = aiohttp.CookieJar()
+            base_url = URL(self.config.BASE_URL)
+            for name, value in self.load_cookies().items():
+                jar.update_cookies({name: value}, base_url)
+
+            session_kwargs = {
+                'cookie_jar': jar,
+                'timeout': aiohttp.ClientTimeout(total=self.config.REQUEST_TIMEOUT)
+            }
+            if trace_configs:
+                session_kwargs['trace_configs'] = trace_configs
+            self.session = aiohttp.ClientSession(**session_kwargs)
+            self._owns_session = True
+
+        await self.warmup()
+
+    async def warmup(self):
+        """Make a request to the main site to pick up cookies"""
+        try:
+            await asyncio.sleep(random.uniform(1.0, 3.0))
+            async with self.session.get(self.config.BASE_URL, headers=self.random_headers(), timeout=self.config.REQUEST_TIMEOUT) as response:
+                if response.status == 200:
+                    self.update_session_cookies(extract_cookies_from_response(response))
+                    self.save_cookies()
+                    logger.info(f"Initialized session with cookies from {self.config.BASE_URL}")
+        except Exception as e:
+            logger.warning(f"Warmup request failed: {e}")
+
+    async def close(self):
+        """Close the session if this fetcher created it"""
+        if self.session is not None and self._owns_session:
+            await self.session.close()
+            self.session = None
+
+    async def fetch(self, url, trace=NULL_TRACE):
+        """
+        Fetch a page.
+
+        Args:
+            url (str): Page to fetch
+            trace (CheckTrace): Trace the fetch phases are recorded on
+
+        Returns:
+            FetchResult: Status, headers and raw body of the response
+        """
+        with trace.span('fetch'):
+            async with self.session.get(url, headers=self.random_headers(), timeout=self.config.REQUEST_TIMEOUT,
+                                        trace_request_ctx={'trace': trace}) as response:
+                with trace.span('body'):
+                    body = await response.read()
+
+        if response.status == 200:
+            # Keep session cookies fresh and store them for future sessions
+            self.update_session_cookies(extract_cookies_from_response(response))
+            self.save_cookies()
+
+        return FetchResult(response.status, response.headers, body, response.charset)
+
+    async def post_json(self, url, payload, trace=NULL_TRACE):
+        """
+        Post a JSON API request.
+
+        Args:
+            url (str): API endpoint
+            payload (dict): JSON body
+            trace (CheckTrace): Trace the request phases are recorded on
+
+        Returns:
+            FetchResult: Status, headers and raw body of the response
+        """
+        with trace.span('fetch'):
+            async with self.session.post(url, json=payload, headers=self.random_headers('api'), timeout=self.config.REQUEST_TIMEOUT,
+                                         trace_request_ctx={'trace': trace}) as response:
+                with trace.span('body'):
+                    body = await response.read()
+        return FetchResult(response.status, response.headers, body, response.charset)
@@ -0,0 +1,130 @@
+"""
+Mock Store Availability API
+
+Local stand-in for the store availability endpoint, for trying out and
+testing the pickup checks without touching the real site. It serves a fixed
+set of stores grouped into ZIP codes; the pickup quantity of every
+(SKU, store) pair switches between zero and a few units on a deterministic
+schedule, so restocks and sell-outs happen while you watch.
+
+Usage:
+    python mock_store_api.py --stores 40 --zips 4 --period 90
+then set in settings.py:
+    STORE_AVAILABILITY = True
+    PICKUP_ENDPOINT = 'http://127.0.0.1:8081/productfulfillment/c/api/2.0/storeAvailability'
+    PICKUP_LOCATIONS = ['10001', '10002']
+
+GET /stats reports the requests received and the SKU x location pairs they asked about.
+"""
+import argparse
+import hashlib
+import time
+
+ENDPOINT_PATH = '/productfulfillment/c/api/2.0/storeAvailability'
+STORES_PER_ZIP_ANSWER = 25  # Stores returned for a ZIP query, like the real endpoint's result limit
+
+__all__ = ['MockInventory', 'create_app']
+
+
+class MockInventory:
+    """
+    Deterministic pickup inventory.
+
+    Args:
+        store_count (int): Number of stores, with IDs 101, 102, ...
+        zip_count (int): Number of ZIP codes (10001, 10002, ...) the stores are spread over
+        period (float): Seconds between possible availability changes of each (SKU, store) pair
+        in_stock_ratio (float): Fraction of periods a pair has stock
+        seed (int): Changes which pairs have stock when
+        clock: Callable returning epoch seconds
+    """
+
+    def __init__(self, store_count=40, zip_count=4, period=90, in_stock_ratio=0.25, seed=1, clock=time.time):
+        self.period = period
+        self.in_stock_ratio = in_stock_ratio
+        self.seed = seed
+        self.clock = clock
+        self.stores = {}
+        for index in range(store_count):
+            store_id = str(101 + index)
+            self.stores[store_id] = {
+                'id': store_id,
+                'name': f"Mock Store {index + 1}",
+                'zipCode': str(10001 + index % max(1, zip_count))
+            }
+        self.requests = 0
+        self.pairs = 0
+
+    def quantity(self, sku, store_id, now):
+        """Return the pickup quantity of a SKU at a store at an epoch timestamp"""
+        offset = int(hashlib.md5(f"{self.seed}:{sku}:{store_id}".encode()).hexdigest()[:8], 16)
+        slot = int((now + offset % self.period) // self.period)
+        roll = int(hashlib.md5(f"{self.seed}:{sku}:{store_id}:{slot}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return 1 + int(roll * 10) % 3 if roll < self.in_stock_ratio else 0
+
+    def answer(self, payload):
+        """Build the response to a store availability request"""
+        if payload.get('locationId'):
+            stores = [self.stores[payload['locationId']]] if payload['locationId'] in self.stores else []
+        else:
+            zip_code = str(payload.get('zipCode', ''))
+            stores = [store for store in self.stores.values() if store['zipCode'] == zip_code][:STORES_PER_ZIP_ANSWER]
+
+        skus = [str(item.get('sku')) for item in payload.get('items', [])]
+        self.requests += 1
+        self.pairs += len(skus) * max(1, len(stores))
+        now = self.clock()
+        return {'ispu': {
+            'locations': stores,
+            'items': [{
+                'sku': sku,
+                'locations': [{
+                    'locationId': store['id'],
+                    'availability': {'availablePickupQuantity': self.quantity(sku, store['id'], now)}
+                } for store in stores]
+            } for sku in skus]
+        }}
+
+
+def create_app(inventory):
+    """Create the aiohttp application serving an inventory"""
+    from aiohttp import web
+
+    async def store_availability(request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'invalid JSON'}, status=400)
+        return web.json_response(inventory.answer(payload))
+
+    async def stats(request):
+        return web.json_response({'requests': inventory.requests, 'sku_location_pairs': inventory.pairs})
+
+    app = web.Application()
+    app.router.add_post(ENDPOINT_PATH, store_availability)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock store availability API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--stores', type=int, default=40, help="Number of stores")
+    parser.add_argument('--zips', type=int, default=4, help="Number of ZIP codes the stores are spread over")
+    parser.add_argument('--period', type=float, default=90, help="Seconds between availability changes")
+    parser.add_argument('--in-stock', type=float, default=0.25, help="Fraction of the time a store has stock")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from aiohttp import web
+
+    inventory = MockInventory(args.stores, args.zips, args.period, args.in_stock, args.seed)
+    print(f"PICKUP_ENDPOINT = 'http://{args.host}:{args.port}{ENDPOINT_PATH}'")
+    print(f"ZIP codes: {', '.join(sorted({store['zipCode'] for store in inventory.stores.values()}))}; "
+          f"store IDs: 101-{100 + args.stores}")
+    web.run_app(create_app(inventory), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
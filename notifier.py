@@ -0,0 +1,122 @@
+"""
+Discord Notifier
+
+Posts in-stock, out-of-stock and store pickup alerts to a Discord webhook. aiohttp is only
+imported when the first alert is sent.
+"""
+import logging
+
+from tracing import NULL_TRACE
+from virtual_clock import SystemClock
+
+logger = logging.getLogger("stock_scanner")
+
+__all__ = ['DiscordNotifier']
+
+
+class DiscordNotifier:
+    """
+    Discord webhook notifier.
+
+    Args:
+        webhook_url (str): Discord webhook URL
+        user_ids (list): Discord user IDs pinged on in-stock alerts
+        clock: Clock used for the timestamp in the message
+        timestamp_format (str): strftime format of the timestamp
+        request_timeout (float): Seconds before a webhook post is abandoned
+        session: Existing aiohttp-compatible session to post with. The notifier
+            does not close sessions it did not create.
+    """
+
+    def __init__(self, webhook_url, user_ids=(), clock=None, timestamp_format='%Y-%m-%d %H:%M:%S',
+                 request_timeout=15, session=None):
+        self.webhook_url = webhook_url
+        self.user_ids = [user_id for user_id in user_ids if user_id]
+        self.clock = clock or SystemClock()
+        self.timestamp_format = timestamp_format
+        self.request_timeout = request_timeout
+        self.session = session
+        self._owns_session = session is None
+
+    def format_message(self, product_name, url, in_stock=True, duration=None):
+        """Build the webhook message for a stock change"""
+        current_time = self.clock.now().strftime(self.timestamp_format)
+        user_pings = ' '.join([f'<@{user_id}>' for user_id in self.user_ids])
+
+        if in_stock:
+            return (
+                f"## {product_name} is IN STOCK!\n"
+                f"-# {current_time}\n"
+                f"[product page]({url})\n"
+                f"{user_pings}"
+            )
+        return (
+            f"## {product_name} is OUT OF STOCK\n"
+            f"-# {current_time}\n"
+            f"It was in stock for: {str(duration).split('.')[0]}"
+        )
+
+    def format_pickup_message(self, product_name, url, available, sold_out):
+        """Build the webhook message for stores gaining or losing pickup availability"""
+        current_time = self.clock.now().strftime(self.timestamp_format)
+        lines = []
+        if available:
+            user_pings = ' '.join([f'<@{user_id}>' for user_id in self.user_ids])
+            lines.append(f"## {product_name} is available for PICKUP!")
+            lines.append(f"-# {current_time}")
+            lines.append(f"Now at: {', '.join(available)}")
+            if sold_out:
+                lines.append(f"Gone from: {', '.join(sold_out)}")
+            lines.append(f"[product page]({url})")
+            lines.append(user_pings)
+        else:
+            lines.append(f"## {product_name} pickup availability dropped")
+            lines.append(f"-# {current_time}")
+            lines.append(f"Gone from: {', '.join(sold_out)}")
+        return '\n'.join(lines)
+
+    async def notify(self, product_name, url, in_stock=True, duration=None, trace=NULL_TRACE):
+        """
+        Send a stock change alert.
+
+        Returns:
+            bool: True if Discord acknowledged the message
+        """
+        return await self._send(self.format_message(product_name, url, in_stock, duration), trace)
+
+    async def notify_pickup(self, product_name, url, available, sold_out, trace=NULL_TRACE):
+        """
+        Send a pickup availability alert.
+
+        Args:
+            available (list): Stores that now have the product for pickup
+            sold_out (list): Stores that no longer do
+
+        Returns:
+            bool: True if Discord acknowledged the message
+        """
+        return await self._send(self.format_pickup_message(product_name, url, available, sold_out), trace)
+
+    async def _send(self, message, trace):
+        trace.mark('notify_enqueue')
+        try:
+            with trace.span('webhook'):
+                if self.session is None:
+                    import aiohttp
+                    self.session = aiohttp.ClientSession()
+                    self._owns_session = True
+                async with self.session.post(self.webhook_url, json={"content": message}, timeout=self.request_timeout) as response:
+                    if response.status != 204:
+                        logger.error(f"Discord rejected the notification with status {response.status}")
+                        return False
+                    trace.mark('webhook_ack')
+                    return True
+        except Exception as e:
+            logger.error(f"Error sending Discord notification: {str(e)}")
+            return False
+
+    async def close(self):
+        """Close the session if this notifier created it"""
+        if self.session is not None and self._owns_session:
+            await self.session.close()
+            self.session = None
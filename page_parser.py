@@ -0,0 +1,82 @@
+"""
+Product Page Parser
+
+Finds the add-to-cart button on a product page and decides whether the
+product can be bought. BeautifulSoup is only imported on the first parse.
+"""
+import logging
+
+logger = logging.getLogger("stock_scanner")
+
+__all__ = ['ProductPageParser']
+
+
+class ProductPageParser:
+    """
+    Add-to-cart button parser.
+
+    Args:
+        button_selectors (list): CSS selectors tried in order for the add-to-cart button
+        text_selectors (list): CSS selectors whose text is checked if no button is found
+    """
+
+    def __init__(self, button_selectors, text_selectors):
+        self.button_selectors = list(button_selectors)
+        self.text_selectors = list(text_selectors)
+        self._soup_class = None
+
+    def _make_soup(self, html):
+        if self._soup_class is None:
+            from bs4 import BeautifulSoup
+            self._soup_class = BeautifulSoup
+        return self._soup_class(html, 'html.parser')
+
+    def parse(self, body, charset=None, sku_id=None):
+        """
+        Parse a product page.
+
+        Args:
+            body (bytes): Raw page body
+            charset (str): Response charset (defaults to utf-8)
+            sku_id (str): SKU whose button selector is tried last
+
+        Returns:
+            tuple: (button_found, is_in_stock)
+        """
+        soup = self._make_soup(body.decode(charset or 'utf-8', errors='replace'))
+
+        # Create button selectors including the SKU-specific one
+        selectors = self.button_selectors.copy()
+        if sku_id:
+            selectors.append(f'[data-sku-id="{sku_id}"] button')
+
+        button_found = False
+        for selector in selectors:
+            if not selector:
+                continue
+
+            add_to_cart_btn = soup.select_one(selector)
+            if add_to_cart_btn:
+                button_found = True
+                button_text = add_to_cart_btn.text.strip().upper()
+                button_state = add_to_cart_btn.get('data-button-state', '')
+                button_class = ' '.join(add_to_cart_btn.get('class', []))
+                is_disabled = 'disabled' in button_class or add_to_cart_btn.get('disabled') == 'disabled'
+
+                logger.info(f"Found button with selector '{selector}'. Text: '{button_text}', State: '{button_state}', Disabled: {is_disabled}")
+
+                if button_state == 'ADD_TO_CART' or ('ADD TO CART' in button_text and not is_disabled):
+                    return True, True
+
+        if button_found:
+            return True, False
+
+        # If no button found, look for availability text in the page
+        for availability_selector in self.text_selectors:
+            availability_element = soup.select_one(availability_selector)
+            if availability_element:
+                text = availability_element.text.strip().upper()
+                if 'ADD TO CART' in text and 'SOLD OUT' not in text:
+                    return True, True
+
+        return False, False
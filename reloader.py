@@ -0,0 +1,125 @@
+"""
+Hot Reload
+
+Watches the files the product catalog and settings come from and applies
+edits to a running Scanner without restarting it. Files are checked by
+modification time every few seconds; on POSIX systems SIGHUP forces a
+reload straight away. A reload that fails (a syntax error in settings.py,
+a product without a URL, ...) is logged and the scanner carries on with
+what it had.
+"""
+import asyncio
+import logging
+import os
+import signal
+
+logger = logging.getLogger("stock_scanner")
+
+__all__ = ['Reloader']
+
+
+class Reloader:
+    """
+    Applies catalog and settings changes to a running scanner.
+
+    Args:
+        scanner: Scanner the changes are applied to
+        load: Callable returning (products, config) read fresh from disk
+        paths (list): Files whose modification time triggers a reload
+        interval (float): Seconds between modification time checks
+    """
+
+    def __init__(self, scanner, load, paths, interval=5):
+        self.scanner = scanner
+        self.load = load
+        self.paths = [path for path in paths if path]
+        self.interval = interval
+        self._mtimes = self._read_mtimes()
+        self._requested = None
+        self._task = None
+        self._signal_installed = False
+
+    def _read_mtimes(self):
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def start(self):
+        """Start watching; must be called from the running event loop"""
+        loop = asyncio.get_running_loop()
+        self._requested = asyncio.Event()
+        if hasattr(signal, 'SIGHUP'):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self.request_reload)
+                self._signal_installed = True
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Not the main thread, or a loop without signal support
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop watching"""
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal_installed = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def request_reload(self):
+        """Reload at the next opportunity, whether or not the files changed"""
+        if self._requested is not None:
+            self._requested.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._requested.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            requested = self._requested.is_set()
+            self._requested.clear()
+            mtimes = self._read_mtimes()
+            if requested or mtimes != self._mtimes:
+                self._mtimes = mtimes
+                self.reload()
+
+    def reload(self):
+        """
+        Load the catalog and settings and apply whatever changed.
+
+        Returns:
+            bool: False if loading failed and nothing was applied
+        """
+        try:
+            products, config = self.load()
+            if not products:
+                raise ValueError("no products defined")
+        except Exception as e:
+            logger.error(f"Reload failed, keeping the current products and settings: {e}")
+            return False
+
+        applied, ignored = self.scanner.update_config(config)
+        added, removed, changed = self.scanner.update_products(products)
+
+        if applied:
+            logger.info(f"Reloaded settings: {', '.join(applied)}")
+        if ignored:
+            logger.warning(f"Restart to apply: {', '.join(ignored)}")
+        for product_name in added:
+            logger.info(f"Now tracking {product_name}: {products[product_name]['url']}")
+        for product_name in removed:
+            logger.info(f"Stopped tracking {product_name}")
+        for product_name in changed:
+            logger.info(f"URL changed for {product_name}: {products[product_name]['url']}")
+        if not (applied or ignored or added or removed or changed):
+            logger.info("Reload found no changes")
+        return True
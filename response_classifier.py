@@ -0,0 +1,99 @@
+"""
+Response Classifier
+
+Labels a fetched response as a product page, a challenge/interstitial, an
+error page or an unexpected layout from its status, headers and raw bytes,
+before any HTML parsing happens. All markers are matched in a single
+case-insensitive scan of the body that stops at the first product marker.
+
+Broad block-page words such as 'captcha' also turn up on ordinary pages
+(a reCAPTCHA script, for one), so they only mark a challenge on non-200
+responses; a 200 is only a challenge by its headers or by a specific
+interstitial marker.
+"""
+import re
+
+PRODUCT_PAGE = 'product'
+CHALLENGE = 'challenge'
+ERROR_PAGE = 'error'
+UNEXPECTED = 'unexpected'
+
+_BLOCKED = 'blocked'  # Scan category for blocked_markers, reported as CHALLENGE
+
+__all__ = ['ResponseClassifier', 'PRODUCT_PAGE', 'CHALLENGE', 'ERROR_PAGE', 'UNEXPECTED']
+
+
+class ResponseClassifier:
+    """
+    Single-pass classifier for product page responses.
+
+    Args:
+        product_markers (list): Substrings that only appear on a real product page
+        challenge_markers (list): Substrings specific to bot-protection challenges and interstitials
+        error_markers (list): Substrings of error pages served with a 200 status
+        challenge_headers (dict): Header name -> value substring that marks a challenge response
+        blocked_markers (list): Broad block-page substrings, only trusted on non-200 responses
+    """
+
+    def __init__(self, product_markers, challenge_markers, error_markers, challenge_headers=None,
+                 blocked_markers=()):
+        self._categories = {}
+        for category, markers in ((PRODUCT_PAGE, product_markers),
+                                  (CHALLENGE, challenge_markers),
+                                  (ERROR_PAGE, error_markers),
+                                  (_BLOCKED, blocked_markers)):
+            for marker in markers:
+                self._categories.setdefault(marker.lower().encode('utf-8'), category)
+
+        # Longest first so a marker that contains another one is matched whole
+        alternatives = sorted(self._categories, key=len, reverse=True)
+        self._pattern = re.compile(b'|'.join(re.escape(marker) for marker in alternatives), re.IGNORECASE)
+        self._challenge_headers = {name.lower(): value.lower() for name, value in (challenge_headers or {}).items()}
+
+    def _scan(self, body):
+        """Return the marker categories found in the body, stopping at the first product marker"""
+        found = set()
+        for match in self._pattern.finditer(body):
+            category = self._categories[match.group(0).lower()]
+            if category == PRODUCT_PAGE:
+                return {PRODUCT_PAGE}
+            found.add(category)
+        return found
+
+    def _challenge_header(self, headers):
+        """Return the name of the first header that marks a challenge, if any"""
+        for name, value in headers.items():
+            expected = self._challenge_headers.get(name.lower())
+            if expected is not None and expected in str(value).lower():
+                return name
+        return None
+
+    def classify(self, status, headers, body):
+        """
+        Classify a response.
+
+        Args:
+            status (int): HTTP status code
+            headers: Response headers (any mapping with items())
+            body (bytes): Raw response body
+
+        Returns:
+            tuple: (label, reason) where label is one of PRODUCT_PAGE, CHALLENGE,
+            ERROR_PAGE or UNEXPECTED and reason is a short human-readable note
+        """
+        header = self._challenge_header(headers)
+        if header:
+            return CHALLENGE, f"{header} header"
+
+        found = self._scan(body)
+        if PRODUCT_PAGE in found and status == 200:
+            return PRODUCT_PAGE, "product markers"
+        if CHALLENGE in found:
+            return CHALLENGE, "challenge markers"
+        if _BLOCKED in found and status != 200:
+            return CHALLENGE, "block page markers"
+        if status != 200:
+            return ERROR_PAGE, f"status {status}"
+        if ERROR_PAGE in found:
+            return ERROR_PAGE, "error page markers"
+        return UNEXPECTED, "no product markers"
@@ -0,0 +1,743 @@
+"""
+Scanner Engine
+
+The Scanner owns all per-product state (stock status, delays, retries) and
+the scheduling loop, and delegates fetching, parsing and notifying to
+pluggable components. Constructing a Scanner has no side effects: nothing is
+read from disk, no network session is opened and heavy dependencies
+(aiohttp, BeautifulSoup) are only imported once it starts. Any number of
+scanners can run in one process.
+
+Example:
+    scanner = Scanner({'GPU': {'url': 'https://www.bestbuy.com/site/...?skuId=123'}},
+                      config=make_config(DEFAULT_DELAY=20))
+    await scanner.start()
+    ...
+    await scanner.stop()
+"""
+import asyncio
+import logging
+import os
+import random
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from adaptive_polling import AdaptivePoller
+from events import EventBroadcaster, EventServer
+from fetcher import HttpFetcher
+from notifier import DiscordNotifier
+from page_parser import ProductPageParser
+from response_classifier import ResponseClassifier, PRODUCT_PAGE, CHALLENGE, ERROR_PAGE
+from snapshots import SnapshotStore
+from store_availability import PickupChecker, parse_location
+from tracing import Tracer, NULL_TRACE
+from virtual_clock import SystemClock
+
+logger = logging.getLogger("stock_scanner")
+
+# Settings that are only read when the scanner starts; changing them needs a restart
+RESTART_REQUIRED_SETTINGS = {
+    'COOKIES_FILE', 'HEADERS_FILE', 'USER_AGENTS_FILE', 'LOG_FILE', 'ENABLE_LOGGING', 'LOGGING_LEVEL',
+    'ADAPTIVE_POLLING', 'RESTOCK_HISTORY_FILE', 'ENABLE_TRACING', 'TRACE_FILE',
+    'ENABLE_SNAPSHOTS', 'SNAPSHOT_DIR', 'SNAPSHOT_MAX_COUNT', 'SNAPSHOT_MAX_BYTES', 'SNAPSHOT_COMPRESSION',
+    'BASE_URL', 'UA_POOL_SIZE', 'HOT_RELOAD', 'RELOAD_CHECK_INTERVAL',
+    'ENABLE_EVENT_STREAM', 'EVENT_STREAM_HOST', 'EVENT_STREAM_PORT', 'EVENT_QUEUE_SIZE', 'STORE_AVAILABILITY'
+}
+
+__all__ = ['Scanner', 'make_config', 'load_env_products']
+
+
+def make_config(reload=False, **overrides):
+    """
+    Return the values from settings.py as a namespace, with overrides applied.
+
+    Args:
+        reload (bool): Re-read settings.py from disk first
+        **overrides: Setting names and values to replace, e.g. DEFAULT_DELAY=20
+
+    Returns:
+        SimpleNamespace: Configuration for a Scanner and its components
+    """
+    import settings
+    if reload:
+        import importlib
+        importlib.reload(settings)
+    values = {name: getattr(settings, name) for name in dir(settings) if name.isupper()}
+    unknown = set(overrides) - set(values)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def load_env_products(environ=None):
+    """Parse PRODUCT_<n>_NAME / PRODUCT_<n>_URL environment variables"""
+    environ = os.environ if environ is None else environ
+    env_products = {}
+    for i in range(1, 10):  # Support up to 9 products
+        product_name = environ.get(f'PRODUCT_{i}_NAME')
+        product_url = environ.get(f'PRODUCT_{i}_URL')
+
+        if product_name and product_url:
+            env_products[product_name] = {
+                'url': product_url,
+            }
+    return env_products
+
+
+def extract_sku_id(url):
+    """Return the skuId query parameter of a product URL, or None"""
+    return url.split('skuId=')[1].split('&')[0] if 'skuId=' in url else None
+
+
+def create_poller(config):
+    """Create the adaptive poller from a configuration (None if adaptive polling is disabled)"""
+    if not config.ADAPTIVE_POLLING:
+        return None
+    return AdaptivePoller(
+        history_file=config.RESTOCK_HISTORY_FILE,
+        default_delay=config.DEFAULT_DELAY,
+        instock_delay=config.INSTOCK_DELAY,
+        min_delay=config.MIN_DELAY,
+        max_delay=config.MAX_DELAY,
+        host_budget=config.HOST_REQUEST_BUDGET,
+        half_life_days=config.HISTORY_HALF_LIFE_DAYS
+    )
+
+
+def create_tracer(config, clock):
+    """Create the check tracer from a configuration (None if tracing is disabled)"""
+    if not config.ENABLE_TRACING:
+        return None
+    return Tracer(clock, export_file=config.TRACE_FILE, slo=config.DETECTION_SLO)
+
+
+def create_snapshot_store(config):
+    """Create the failure snapshot ring buffer from a configuration (None if disabled)"""
+    if not config.ENABLE_SNAPSHOTS:
+        return None
+    return SnapshotStore(
+        directory=config.SNAPSHOT_DIR,
+        max_count=config.SNAPSHOT_MAX_COUNT,
+        max_bytes=config.SNAPSHOT_MAX_BYTES,
+        compression=config.SNAPSHOT_COMPRESSION
+    )
+
+
+def create_event_broadcaster(config):
+    """Create the stock event broadcaster from a configuration (None if the event stream is disabled)"""
+    if not config.ENABLE_EVENT_STREAM:
+        return None
+    return EventBroadcaster(queue_size=config.EVENT_QUEUE_SIZE)
+
+
+def create_pickup_checker(config, fetcher, clock):
+    """Create the store pickup checker from a configuration (None if store availability is disabled)"""
+    if not config.STORE_AVAILABILITY or not config.PICKUP_LOCATIONS:
+        return None
+    return PickupChecker(
+        fetcher,
+        config.PICKUP_LOCATIONS,
+        endpoint=config.PICKUP_ENDPOINT,
+        clock=clock,
+        cache_ttl=config.PICKUP_CACHE_TTL,
+        batch_size=config.PICKUP_BATCH_SIZE,
+        concurrency=config.BATCH_SIZE
+    )
+
+
+def create_classifier(config):
+    """Create the response classifier from a configuration"""
+    return ResponseClassifier(
+        product_markers=config.PRODUCT_PAGE_MARKERS,
+        challenge_markers=config.PROTECTION_INDICATORS,
+        error_markers=config.ERROR_PAGE_MARKERS,
+        challenge_headers=config.PROTECTION_HEADERS,
+        blocked_markers=config.BLOCKED_PAGE_MARKERS
+    )
+
+
+class Scanner:
+    """
+    Product availability scanner.
+
+    Components left as None are built from the configuration when the
+    scanner is constructed; none of them touch the disk or network until
+    start() is called.
+
+    Args:
+        products (dict): Product name -> {'url': product page URL}
+        config: Configuration from make_config() (defaults to settings.py as is)
+        clock: Time source (SystemClock by default, VirtualClock in simulation)
+        fetcher: Object with async open(trace_configs), fetch(url, trace) -> FetchResult and close()
+        parser: Object with parse(body, charset, sku_id) -> (button_found, is_in_stock)
+        notifier: Object with async notify(product_name, url, in_stock, duration, trace) and close(),
+            plus notify_pickup(product_name, url, available, sold_out) if store pickup is checked
+        classifier: ResponseClassifier used before parsing
+        poller: AdaptivePoller (not used if ADAPTIVE_POLLING is off and none is given)
+        tracer: Tracer (not used if ENABLE_TRACING is off and none is given)
+        snapshots: SnapshotStore (not used if ENABLE_SNAPSHOTS is off and none is given)
+        events: EventBroadcaster stock transitions are published to (not used if
+            ENABLE_EVENT_STREAM is off and none is given). The local event server
+            is only started for a broadcaster built from the configuration.
+        pickup: PickupChecker (not used if STORE_AVAILABILITY is off and none is given)
+        console (bool): Print a coloured status line after every check
+    """
+
+    def __init__(self, products, config=None, clock=None, fetcher=None, parser=None, notifier=None,
+                 classifier=None, poller=None, tracer=None, snapshots=None, events=None, pickup=None, console=True):
+        self.config = config or make_config()
+        self.clock = clock or SystemClock()
+        config = self.config
+
+        self.fetcher = fetcher or HttpFetcher(config)
+        self.parser = parser or ProductPageParser(config.BUTTON_SELECTORS, config.TEXT_SELECTORS)
+        self.notifier = notifier or DiscordNotifier(
+            config.DISCORD_WEBHOOK_URL,
+            config.DISCORD_USER_IDS,
+            clock=self.clock,
+            timestamp_format=config.TIMESTAMP_FORMAT,
+            request_timeout=config.REQUEST_TIMEOUT
+        )
+        self.classifier = classifier or create_classifier(config)
+        self.poller = poller if poller is not None else create_poller(config)
+        self.tracer = tracer if tracer is not None else create_tracer(config, self.clock)
+        self.snapshots = snapshots if snapshots is not None else create_snapshot_store(config)
+        self.events = events if events is not None else create_event_broadcaster(config)
+        self.event_server = None
+        self._serve_events = events is None and self.events is not None
+        self.pickup = pickup if pickup is not None else create_pickup_checker(config, self.fetcher, self.clock)
+        self.console = console
+
+        self.products = {}
+        self.product_stock_status = {}
+        self.product_stock_times = {}
+        self.product_check_delays = {}
+        self.retry_counts = {}
+        self.host_retry_counts = {}  # Consecutive challenges per host
+        self.last_responses = {}  # Last raw response per URL, kept for failure snapshots
+        self.last_check = {}  # Epoch seconds each product was last dispatched
+        self._task = None
+        self._pickup_task = None
+        self._wakeup = None  # Set to make the scheduler re-plan before its sleep is over
+
+        self.track_products(products)
+
+    def track_products(self, new_products):
+        """Replace the tracked products and reset their stock, delay and retry state"""
+        self.products = {}
+        for product_name, product_info in new_products.items():
+            info = dict(product_info)
+            info['sku_id'] = extract_sku_id(info['url'])
+            self.products[product_name] = info
+
+        self.product_stock_status = {product: False for product in self.products}
+        self.product_stock_times = {}
+        self.product_check_delays = {product: self.config.DEFAULT_DELAY for product in self.products}
+        self.retry_counts = {product: 0 for product in self.products}
+        self.host_retry_counts = {}
+        self.last_responses = {}
+        self.last_check = {product: 0 for product in self.products}
+
+    def _add_product(self, product_name, product_info):
+        info = dict(product_info)
+        info['sku_id'] = extract_sku_id(info['url'])
+        self.products[product_name] = info
+        self.product_stock_status[product_name] = False
+        self.product_check_delays[product_name] = self.config.DEFAULT_DELAY
+        self.retry_counts[product_name] = 0
+        self.last_check[product_name] = 0  # Due immediately
+
+    def _remove_product(self, product_name):
+        info = self.products.pop(product_name)
+        for state in (self.product_stock_status, self.product_stock_times, self.product_check_delays,
+                      self.retry_counts, self.last_check):
+            state.pop(product_name, None)
+        if not any(other['url'] == info['url'] for other in self.products.values()):
+            self.last_responses.pop(info['url'], None)
+        if self.pickup and not any(other['sku_id'] == info['sku_id'] for other in self.products.values()):
+            self.pickup.forget(info['sku_id'])
+        if self.poller:
+            key = info['sku_id'] or info['url']
+            if not any((other['sku_id'] or other['url']) == key for other in self.products.values()):
+                self.poller.forget(key)
+
+    def update_products(self, new_products):
+        """
+        Apply a new product catalog as a diff while the scanner keeps running.
+
+        Added products are checked right away, removed ones are dropped from the
+        schedule and products whose URL changed start over. Every other
+        product keeps its stock status, delay, retries and schedule.
+
+        Returns:
+            tuple: (added, removed, changed) lists of product names
+        """
+        added = [name for name in new_products if name not in self.products]
+        removed = [name for name in self.products if name not in new_products]
+        changed = [name for name in new_products
+                   if name in self.products and new_products[name]['url'] != self.products[name]['url']]
+
+        for product_name in removed + changed:
+            self._remove_product(product_name)
+        for product_name in added + changed:
+            self._add_product(product_name, new_products[product_name])
+
+        if added or removed or changed:
+            self.wake()
+        return added, removed, changed
+
+    def update_config(self, new_config):
+        """
+        Apply new settings in place while the scanner keeps running.
+
+        Delays, selectors, markers, batching and timeouts take effect
+        immediately; settings in RESTART_REQUIRED_SETTINGS are kept as they are.
+
+        Returns:
+            tuple: (applied, ignored) lists of changed setting names
+        """
+        old_values = vars(self.config)
+        changed = sorted(name for name, value in vars(new_config).items() if old_values.get(name) != value)
+        restart_required = set(RESTART_REQUIRED_SETTINGS)
+        if self.pickup is None:
+            # Pickup settings only take effect on a pickup checker built at start-up
+            restart_required.update(name for name in changed if name.startswith('PICKUP_'))
+        applied = [name for name in changed if name not in restart_required]
+        ignored = [name for name in changed if name in restart_required]
+        if not applied:
+            return applied, ignored
+
+        config = self.config
+        for name in applied:
+            setattr(config, name, getattr(new_config, name))
+
+        if isinstance(self.parser, ProductPageParser):
+            self.parser.button_selectors = list(config.BUTTON_SELECTORS)
+            self.parser.text_selectors = list(config.TEXT_SELECTORS)
+        if isinstance(self.classifier, ResponseClassifier):
+            self.classifier = create_classifier(config)
+        if isinstance(self.notifier, DiscordNotifier):
+            self.notifier.webhook_url = config.DISCORD_WEBHOOK_URL
+            self.notifier.user_ids = [user_id for user_id in config.DISCORD_USER_IDS if user_id]
+            self.notifier.timestamp_format = config.TIMESTAMP_FORMAT
+            self.notifier.request_timeout = config.REQUEST_TIMEOUT
+        if self.poller:
+            self.poller.default_delay = config.DEFAULT_DELAY
+            self.poller.instock_delay = config.INSTOCK_DELAY
+            self.poller.min_delay = config.MIN_DELAY
+            self.poller.max_delay = config.MAX_DELAY
+            self.poller.host_budget = config.HOST_REQUEST_BUDGET
+            self.poller.half_life = config.HISTORY_HALF_LIFE_DAYS * 24 * 60 * 60
+        if self.tracer:
+            self.tracer.slo = config.DETECTION_SLO
+        if isinstance(self.pickup, PickupChecker):
+            self.pickup.locations = list(dict.fromkeys(parse_location(location) for location in config.PICKUP_LOCATIONS))
+            self.pickup.endpoint = config.PICKUP_ENDPOINT
+            self.pickup.cache_ttl = config.PICKUP_CACHE_TTL
+            self.pickup.batch_size = config.PICKUP_BATCH_SIZE
+            self.pickup.concurrency = config.BATCH_SIZE
+
+        # Products on a regular schedule move to the new delays; backed-off ones keep their backoff
+        if not self.poller:
+            for product_name in self.products:
+                if self.retry_counts[product_name] == 0:
+                    self.reset_delay(product_name)
+
+        self.wake()
+        return applied, ignored
+
+    def wake(self):
+        """Make a sleeping scheduler re-plan its next check now"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # Lifecycle
+
+    async def open(self):
+        """Load the restock history and open the fetcher (user agents, headers, cookies and warmup)"""
+        if self.poller:
+            self.poller.load()
+        trace_configs = [self.tracer.trace_config()] if self.tracer else None
+        await self.fetcher.open(trace_configs=trace_configs)
+        if self._serve_events:
+            self.event_server = EventServer(self.events, self.status_snapshot,
+                                            host=self.config.EVENT_STREAM_HOST, port=self.config.EVENT_STREAM_PORT)
+            await self.event_server.start()
+
+    async def close(self):
+        """Close the components and flush tracing and snapshot output"""
+        if self.event_server:
+            await self.event_server.stop()
+            self.event_server = None
+        await self.fetcher.close()
+        await self.notifier.close()
+        if self.tracer:
+            self.tracer.log_summary()
+            self.tracer.close()
+        if self.snapshots:
+            self.snapshots.close()
+
+    async def start(self, until=None):
+        """Open the components and start the scheduling loop in the background"""
+        if self._task is not None:
+            raise RuntimeError("Scanner is already running")
+        await self.open()
+        self._task = asyncio.ensure_future(self.run_scheduler(until))
+        if self.pickup:
+            self._pickup_task = asyncio.ensure_future(self.run_pickup_scheduler(until))
+
+    async def wait(self):
+        """Wait for the scheduling loop to finish (it only finishes on its own if started with `until`)"""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def stop(self):
+        """Stop the scheduling loops and close the components"""
+        tasks = [self._task, self._pickup_task]
+        self._task = self._pickup_task = None
+        for task in tasks:
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await self.close()
+
+    async def run(self, until=None):
+        """Run the scanner until the clock reaches `until` (forever if None), then close it"""
+        await self.start(until)
+        try:
+            await self.wait()
+        finally:
+            await self.stop()
+
+    # Checking
+
+    def back_off_host(self, url):
+        """Stretch the check delay of every product on the same host and return the backoff delay"""
+        host = urlparse(url).netloc
+        self.host_retry_counts[host] = self.host_retry_counts.get(host, 0) + 1
+        backoff_delay = min(300, self.config.DEFAULT_DELAY * (2 ** min(self.host_retry_counts[host], 5)))
+        for name, info in self.products.items():
+            if urlparse(info['url']).netloc == host:
+                self.product_check_delays[name] = max(self.product_check_delays[name], backoff_delay)
+        return backoff_delay
+
+    def restore_host(self, url):
+        """Clear a host's backoff after a good response and put its products back on their regular delays"""
+        host = urlparse(url).netloc
+        if self.host_retry_counts.pop(host, None) is None:
+            return
+        for name, info in self.products.items():
+            if urlparse(info['url']).netloc == host and self.retry_counts[name] == 0:
+                self.reset_delay(name)
+
+    def reset_delay(self, product_name):
+        """Put a product back on the regular delay for its stock status"""
+        in_stock = self.product_stock_status[product_name]
+        self.product_check_delays[product_name] = self.config.INSTOCK_DELAY if in_stock else self.config.DEFAULT_DELAY
+
+    def save_failure_snapshot(self, product_name, url, reason):
+        """Hand the last response received for a product to the snapshot writer"""
+        cached = self.last_responses.get(url)
+        if not cached or not self.snapshots:
+            return
+        if not self.snapshots.submit(
+            cached['body'],
+            product=product_name,
+            url=url,
+            status=cached['status'],
+            headers=cached['headers'],
+            page=cached['page'],
+            reason=reason,
+            retries=self.retry_counts.get(product_name, 0),
+            captured_at=cached['timestamp']
+        ):
+            logger.warning(f"Snapshot writer is behind, dropped snapshot for {product_name}")
+
+    def status_snapshot(self):
+        """Return the current status of every product as a JSON-serialisable dict"""
+        products = {}
+        for product_name, info in self.products.items():
+            since = self.product_stock_times.get(product_name)
+            last_check = self.last_check.get(product_name) or None
+            products[product_name] = {
+                'sku_id': info.get('sku_id'),
+                'url': info['url'],
+                'in_stock': self.product_stock_status[product_name],
+                'in_stock_since': since.timestamp() if since and self.product_stock_status[product_name] else None,
+                'last_checked': last_check,
+                'next_check': last_check + self.product_check_delays[product_name] if last_check else None,
+                'retries': self.retry_counts[product_name]
+            }
+            if self.pickup:
+                products[product_name]['pickup_stores'] = self.pickup.available_stores(info.get('sku_id'))
+        return {'timestamp': self.clock.time(), 'products': products}
+
+    def publish_transition(self, product_name, in_stock, duration, check_latency):
+        """Publish a stock transition to the event stream"""
+        self._publish('restock' if in_stock else 'sold_out', product_name, check_latency,
+                      in_stock=in_stock, duration=duration.total_seconds() if duration is not None else None)
+
+    def _publish(self, event_type, product_name, check_latency, **fields):
+        if self.events is None:
+            return
+        info = self.products[product_name]
+        self.events.publish({
+            'type': event_type,
+            'timestamp': self.clock.time(),
+            'product': product_name,
+            'sku_id': info.get('sku_id'),
+            'url': info['url'],
+            **fields,
+            'check_latency': round(check_latency, 3)
+        })
+
+    def report(self, product_name, in_stock, current_time):
+        """Print the coloured status line for a check"""
+        if not self.console:
+            return
+        config = self.config
+        status = "IN STOCK!!!" if in_stock else "OUT OF STOCK..."
+        msg_template = config.IN_STOCK_MSG if in_stock else config.OUT_STOCK_MSG
+        print(f"[{config.TIME_PREFIX}] {msg_template}".format(
+            timestamp=current_time.strftime(config.TIMESTAMP_FORMAT),
+            product=product_name,
+            status=status
+        ))
+
+    async def check_availability(self, product_name, trace=NULL_TRACE):
+        """Check one product, update its state and send alerts on stock changes"""
+        config = self.config
+        product_info = self.products.get(product_name)
+        if product_info is None:
+            return  # Removed from the catalog before the check started
+        url = product_info['url']
+        sku_id = product_info.get('sku_id')
+        current_time = self.clock.now()
+        snapshot_saved = False  # At most one snapshot per failed check
+
+        try:
+            trace.dispatch()
+
+            # Add random delay between 1 and 3 seconds to appear more human-like
+            with trace.span('jitter'):
+                await asyncio.sleep(random.uniform(1.0, 3.0))
+
+            # Try to check availability
+            is_in_stock = False
+            button_found = False
+
+            # Scrape the product page with standard approach
+            started = self.clock.time()  # Check latency excludes the jitter above
+            response = await self.fetcher.fetch(url, trace)
+            trace.set(status=response.status)
+            if self.products.get(product_name) is not product_info:
+                trace.set(outcome='removed')
+                return  # Removed or replaced in the catalog while the request was in flight
+
+            # Label the response once from its raw bytes and route it before any parsing
+            with trace.span('classify'):
+                page_type, reason = self.classifier.classify(response.status, response.headers, response.body)
+            trace.set(page=page_type)
+            self.last_responses[url] = {
+                'body': response.body,
+                'status': response.status,
+                'headers': dict(response.headers),
+                'page': page_type,
+                'timestamp': self.clock.time()
+            }
+
+            if page_type == CHALLENGE:
+                backoff_delay = self.back_off_host(url)
+                logger.warning(f"Detected protection mechanism for {product_name} ({reason}). Backing off this host for {backoff_delay}s. Consider using a proxy or reducing request frequency.")
+                trace.set(outcome='challenge')
+                self.save_failure_snapshot(product_name, url, f"challenge: {reason}")
+                return  # Exit early to avoid further processing
+            elif response.status == 429 or response.status == 403:
+                logger.warning(f"Received status {response.status} - Rate limited or blocked. Backing off...")
+                trace.set(outcome='blocked')
+                self.retry_counts[product_name] += 1
+                self.product_check_delays[product_name] = min(300, config.DEFAULT_DELAY * (2 ** min(self.retry_counts[product_name], 5)))
+                return  # Exit early to avoid further processing
+            elif page_type == PRODUCT_PAGE:
+                self.restore_host(url)
+
+                # Parse HTML with error handling
+                try:
+                    with trace.span('parse'):
+                        button_found, is_in_stock = self.parser.parse(response.body, response.charset, sku_id)
+                except Exception as parse_error:
+                    logger.error(f"Error parsing HTML: {parse_error}")
+            elif page_type == ERROR_PAGE:
+                logger.error(f"HTTP error: {response.status} ({reason}) when accessing {url}")
+            else:
+                # Markers can lag behind the site, so still look for the button
+                logger.warning(f"Unexpected page layout for {product_name} ({reason})")
+                try:
+                    with trace.span('parse'):
+                        button_found, is_in_stock = self.parser.parse(response.body, response.charset, sku_id)
+                except Exception as parse_error:
+                    logger.error(f"Error parsing HTML: {parse_error}")
+                if not button_found:
+                    # Keep a copy of layouts we do not recognise so selectors can be fixed
+                    self.save_failure_snapshot(product_name, url, f"unexpected layout: {reason}")
+                    snapshot_saved = True
+
+            if not button_found:
+                raise ValueError("Add to cart button not found with any selector")
+
+            # Process stock status changes
+            if is_in_stock:
+                trace.set(outcome='in_stock')
+                if not self.product_stock_status[product_name]:
+                    trace.mark('transition')
+                    trace.set(outcome='restock')
+                    self.product_stock_status[product_name] = True
+                    self.product_stock_times[product_name] = current_time
+                    self.product_check_delays[product_name] = config.INSTOCK_DELAY
+                    self.publish_transition(product_name, True, None, self.clock.time() - started)
+                    await self.notifier.notify(product_name, url, trace=trace)
+            else:
+                trace.set(outcome='out_of_stock')
+                if self.product_stock_status[product_name]:
+                    trace.mark('transition')
+                    trace.set(outcome='sold_out')
+                    duration = current_time - self.product_stock_times[product_name]
+                    self.product_stock_status[product_name] = False
+                    self.product_check_delays[product_name] = config.DEFAULT_DELAY
+                    self.publish_transition(product_name, False, duration, self.clock.time() - started)
+                    await self.notifier.notify(product_name, url, False, duration, trace=trace)
+
+            # Let the restock history pick the next delay
+            if self.poller:
+                # Restock history belongs to the SKU, not to the product's name
+                history_key = sku_id or url
+                self.poller.record(history_key, is_in_stock, self.clock.time())
+                self.product_check_delays[product_name] = self.poller.next_delay(history_key, url, is_in_stock, self.clock.time())
+
+            self.report(product_name, is_in_stock, current_time)
+
+            # Reset retry count on success
+            self.retry_counts[product_name] = 0
+
+        except Exception as e:
+            # Improved error handling
+            trace.set(outcome='error', error=str(e))
+            if self.products.get(product_name) is not product_info:
+                return
+            self.retry_counts[product_name] += 1
+            backoff_delay = min(120, config.DEFAULT_DELAY * (2 ** min(self.retry_counts[product_name], 4)))
+            self.product_check_delays[product_name] = backoff_delay
+            logger.error(f"Error checking {product_name}: {str(e)}. Retrying in {backoff_delay}s")
+
+            # If we've failed multiple times, keep the last response for debugging
+            if self.retry_counts[product_name] >= config.MAX_RETRIES and not snapshot_saved:
+                self.save_failure_snapshot(product_name, url, str(e))
+        finally:
+            trace.finish()
+
+    async def run_scheduler(self, until=None):
+        """Check each product whenever its delay has elapsed, until the clock reaches `until` (forever if None)"""
+        config = self.config
+        clock = self.clock
+        self._wakeup = asyncio.Event()
+
+        while until is None or clock.time() < until:
+            current_time = clock.time()
+
+            # Find next product to check
+            next_check_time = float('inf')
+            for product_name in self.products:
+                check_time = self.last_check[product_name] + self.product_check_delays[product_name]
+                if check_time < next_check_time:
+                    next_check_time = check_time
+
+            # Sleep until next check is due, or until the catalog or settings change
+            sleep_time = max(0, next_check_time - current_time)
+            if until is not None:
+                sleep_time = min(sleep_time, max(0, until - current_time))
+            if (sleep_time > 0):
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), None if sleep_time == float('inf') else sleep_time)
+                except asyncio.TimeoutError:
+                    pass
+
+            # Check which products need processing
+            current_time = clock.time()
+            tasks = []
+
+            for product_name in self.products:
+                due = self.last_check[product_name] + self.product_check_delays[product_name]
+                if current_time >= due:
+                    # Products never checked before (at start-up or added by a reload) are due when queued
+                    first_check = self.last_check[product_name] == 0
+                    trace = self.tracer.start_check(product_name, None if first_check else due) if self.tracer else NULL_TRACE
+                    tasks.append(self.check_availability(product_name, trace))
+                    self.last_check[product_name] = current_time
+
+            # Run all checks with some concurrency control
+            if tasks:
+                for i in range(0, len(tasks), config.BATCH_SIZE):
+                    batch = tasks[i:i+config.BATCH_SIZE]
+                    await asyncio.gather(*batch)
+                    if i + config.BATCH_SIZE < len(tasks):
+                        # Add small delay between batches
+                        await asyncio.sleep(random.uniform(config.BATCH_DELAY_MIN, config.BATCH_DELAY_MAX))
+
+    # Store pickup
+
+    async def check_pickup(self):
+        """Check pickup availability of every tracked SKU and alert on stores that gained or lost it"""
+        products_by_sku = {}
+        for product_name, info in self.products.items():
+            if info.get('sku_id'):
+                products_by_sku.setdefault(info['sku_id'], []).append(product_name)
+        if not products_by_sku:
+            return
+
+        # The pickup API shares its host with the product pages, so it honours the same backoff
+        endpoint = self.pickup.endpoint
+        if urlparse(endpoint).netloc in self.host_retry_counts:
+            logger.info("Skipping pickup availability check while the host is backed off")
+            return
+
+        started = self.clock.time()
+        try:
+            transitions = await self.pickup.check(list(products_by_sku))
+        except Exception as e:
+            logger.error(f"Error checking pickup availability: {str(e)}")
+            return
+        check_latency = self.clock.time() - started
+
+        if self.pickup.blocked:
+            backoff_delay = self.back_off_host(endpoint)
+            logger.warning(f"Pickup availability query got status {self.pickup.blocked} - Rate limited or blocked. Backing off this host for {backoff_delay}s.")
+
+        for sku_id, available, sold_out in transitions:
+            available_labels = [self.pickup.store_label(store_id) for store_id in available]
+            sold_out_labels = [self.pickup.store_label(store_id) for store_id in sold_out]
+            for product_name in products_by_sku[sku_id]:
+                if product_name not in self.products:
+                    continue  # Removed from the catalog while the check was running
+                if available:
+                    logger.info(f"{product_name} available for pickup at {', '.join(available_labels)}")
+                if sold_out:
+                    logger.info(f"{product_name} no longer available for pickup at {', '.join(sold_out_labels)}")
+                self._publish('pickup', product_name, check_latency,
+                              stores=self.pickup.available_stores(sku_id), available=available, sold_out=sold_out)
+                await self.notifier.notify_pickup(product_name, self.products[product_name]['url'],
+                                                  available_labels, sold_out_labels)
+
+    async def run_pickup_scheduler(self, until=None):
+        """Check pickup availability every PICKUP_DELAY seconds, until the clock reaches `until` (forever if None)"""
+        clock = self.clock
+        while until is None or clock.time() < until:
+            await self.check_pickup()
+            sleep_time = self.config.PICKUP_DELAY
+            if until is not None:
+                sleep_time = min(sleep_time, max(0, until - clock.time()))
+            await asyncio.sleep(sleep_time)
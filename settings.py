@@ -1,8 +1,9 @@
-from colorama import Fore, Style
+import os
 
 # File paths
 COOKIES_FILE = 'cookies.json'
-HEADERS_FILE = 'headers.json'
+HEADERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'headers.json')
+USER_AGENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_agents.json')
 LOG_FILE = 'log.txt'  # Renamed from stock_scanner.log to log.txt
 
 # Logging settings
@@ -24,16 +25,62 @@ INSTOCK_DELAY = 5     # Reduced delay when product is in stock (seconds)
 MAX_RETRIES = 3       # Maximum number of retries on failure
 CACHE_TTL = 30        # Cache time-to-live (seconds)
 
+# Adaptive polling settings
+ADAPTIVE_POLLING = False  # Learn restock windows per product instead of using fixed delays (compare with simulate.py first)
+RESTOCK_HISTORY_FILE = 'restock_history.json'
+MIN_DELAY = 10            # Shortest delay around a likely restock window (seconds)
+MAX_DELAY = 120           # Longest delay during hours that never see restocks (seconds)
+HOST_REQUEST_BUDGET = None  # Maximum product checks per minute against a single host (None: products x 60 / DEFAULT_DELAY)
+HISTORY_HALF_LIFE_DAYS = 14  # Age at which a past restock counts for half as much
+
+# Failure snapshot settings
+ENABLE_SNAPSHOTS = True   # Keep compressed copies of responses from failed checks
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_MAX_COUNT = 50   # Oldest snapshots are deleted beyond this many
+SNAPSHOT_MAX_BYTES = 20 * 1024 * 1024  # ...or beyond this much disk space
+SNAPSHOT_COMPRESSION = 'zstd'  # 'zstd' (needs the zstandard package, falls back to gzip) or 'gzip'
+
+# Tracing settings
+ENABLE_TRACING = False    # Record per-check timings and detection latency
+TRACE_FILE = 'traces.jsonl'  # Finished check traces are appended here as JSON lines
+DETECTION_SLO = 60        # Target seconds from last out-of-stock check to delivered in-stock alert
+
+# Hot reload settings
+HOT_RELOAD = True         # Apply edits to settings.py and .env products without restarting (also on SIGHUP)
+RELOAD_CHECK_INTERVAL = 5 # How often the files are checked for changes (seconds)
+
+# Event stream settings
+ENABLE_EVENT_STREAM = False   # Publish stock changes on a local SSE/WebSocket server
+EVENT_STREAM_HOST = '127.0.0.1'
+EVENT_STREAM_PORT = 8765      # http://127.0.0.1:8765/events (SSE), /ws (WebSocket), /status (JSON)
+EVENT_QUEUE_SIZE = 100        # Events buffered per subscriber before its oldest are dropped
+
+# Store pickup settings
+STORE_AVAILABILITY = False  # Also check in-store pickup availability at PICKUP_LOCATIONS
+PICKUP_LOCATIONS = []       # Store IDs and/or 5-digit ZIP codes (a ZIP covers the stores near it), e.g. ['55423', '281']
+PICKUP_ENDPOINT = 'https://www.bestbuy.com/productfulfillment/c/api/2.0/storeAvailability'
+PICKUP_DELAY = 30           # Delay between pickup availability checks (seconds)
+PICKUP_CACHE_TTL = 60       # How long an answer for a location is reused (seconds); checks in between only query new SKUs
+PICKUP_BATCH_SIZE = 10      # SKUs asked about per request
+
 # Batch processing
 BATCH_SIZE = 3        # Number of concurrent checks to perform
 BATCH_DELAY_MIN = 2.0 # Minimum delay between batches (seconds)
 BATCH_DELAY_MAX = 5.0 # Maximum delay between batches (seconds)
 
-# Formatting
+# Discord settings (run.py fills these in from DISCORD_WEBHOOK_URL / DISCORD_USER_IDS in .env)
+DISCORD_WEBHOOK_URL = None
+DISCORD_USER_IDS = []
+
+# Formatting (ANSI colours; colorama translates them on Windows consoles)
+GREY = '\033[90m'
+GREEN = '\033[32m'
+RED = '\033[31m'
+RESET = '\033[0m'
 TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
-TIME_PREFIX = f"{Fore.LIGHTBLACK_EX}{{timestamp}}{Style.RESET_ALL}"
-IN_STOCK_MSG = f"{Fore.GREEN}{{product}} is {{status}}{Style.RESET_ALL}"
-OUT_STOCK_MSG = f"{Fore.RED}{{product}} is {{status}}{Style.RESET_ALL}"
+TIME_PREFIX = f"{GREY}{{timestamp}}{RESET}"
+IN_STOCK_MSG = f"{GREEN}{{product}} is {{status}}{RESET}"
+OUT_STOCK_MSG = f"{RED}{{product}} is {{status}}{RESET}"
 
 # Base URLs
 BASE_URL = 'https://www.bestbuy.com'
@@ -52,8 +99,31 @@ TEXT_SELECTORS = [
     '.priceView-customer-price'
 ]
 
-# Protection detection selectors
+# Response classification markers (matched case-insensitively against the raw response before parsing)
+PRODUCT_PAGE_MARKERS = [
+    'add-to-cart-button',
+    'data-button-state',
+    'priceView-hero-price',
+    'priceView-customer-price'
+]
+
+# Protection detection markers
 PROTECTION_INDICATORS = [
-    '#challenge-running',
-    '.cf-browser-verification'
+    'challenge-running',
+    'cf-browser-verification',
+    'cf-chl'
+]
+# Too common on ordinary pages to trust on a 200 response; only mark a challenge on other statuses
+BLOCKED_PAGE_MARKERS = [
+    'captcha',
+    'Access Denied'
+]
+PROTECTION_HEADERS = {
+    'cf-mitigated': 'challenge'
+}
+
+ERROR_PAGE_MARKERS = [
+    'Something went wrong',
+    'Page Not Found',
+    'temporarily unavailable'
 ]
@@ -0,0 +1,384 @@
+"""
+Scanner Simulation
+
+Runs the real Scanner scheduler, backoff and notification code against a
+scripted availability timeline for a synthetic catalog. Time is virtual (see
+virtual_clock.py) and all randomness is seeded, so a week of scanning takes
+seconds and the same seed always produces the same result.
+
+Usage:
+    python simulate.py --products 5 --days 7 --seed 1
+    python simulate.py --scenario scenario.json --runs 20
+    python simulate.py --set DEFAULT_DELAY=20 --set ADAPTIVE_POLLING=True
+    python simulate.py --trace traces.jsonl
+"""
+import argparse
+import ast
+import asyncio
+import bisect
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+from fetcher import HttpFetcher
+from notifier import DiscordNotifier
+from scanner import Scanner, make_config
+from virtual_clock import VirtualClock, run_virtual
+
+SIM_BASE_URL = 'https://www.bestbuy.com'
+SIM_WEBHOOK_URL = 'https://discord.invalid/api/webhooks/simulation'
+
+IN_STOCK_HTML = (
+    '<html><body><div data-sku-id="{sku}">'
+    '<button class="add-to-cart-button" data-button-state="ADD_TO_CART">Add to Cart</button>'
+    '</div></body></html>'
+)
+OUT_OF_STOCK_HTML = (
+    '<html><body><div data-sku-id="{sku}">'
+    '<button class="add-to-cart-button disabled" data-button-state="SOLD_OUT" disabled="disabled">Sold Out</button>'
+    '</div></body></html>'
+)
+
+# A window counts as detected if the alert lands before it closes plus this grace period (seconds)
+DETECTION_GRACE = 60
+
+
+def generate_scenario(product_count=5, days=7, seed=1, restocks_per_week=3):
+    """
+    Generate a synthetic catalog with a scripted availability timeline.
+
+    Each product restocks mostly around its own preferred weekday and hour,
+    with the occasional restock at a random time, so adaptive polling has a
+    pattern to learn.
+
+    Args:
+        product_count (int): Number of synthetic products
+        days (int): Length of the timeline in days
+        seed (int): Seed for the timeline generator
+        restocks_per_week (int): Average restocks per product per week
+
+    Returns:
+        dict: Scenario with 'start', 'duration' and 'products'
+    """
+    rng = random.Random(seed)
+    # Start on a Monday at midnight so hour-of-week buckets line up with the timeline
+    start = datetime(2025, 1, 6).timestamp()
+    duration = days * 86400
+
+    scenario_products = []
+    for index in range(product_count):
+        sku = str(6500000 + index)
+        preferred_days = rng.sample(range(7), k=min(7, max(1, restocks_per_week)))
+        preferred_hour = rng.randint(8, 20)
+
+        windows = []
+        for day in range(days):
+            if day % 7 in preferred_days:
+                opens = day * 86400 + preferred_hour * 3600 + rng.gauss(0, 900)
+            elif rng.random() < 0.05:
+                opens = day * 86400 + rng.uniform(0, 86400)
+            else:
+                continue
+            closes = opens + rng.uniform(120, 1800)
+            windows.append([max(0.0, opens), min(float(duration), closes)])
+
+        windows.sort()
+        scenario_products.append({
+            'name': f"Sim Product {index + 1}",
+            'sku_id': sku,
+            'windows': windows
+        })
+
+    return {'start': start, 'duration': duration, 'products': scenario_products}
+
+
+def load_scenario(path):
+    """Load a scenario from a JSON file (same shape as generate_scenario returns)"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class SimulatedHeaders(dict):
+    """Response headers with the aiohttp multidict methods run.py uses"""
+
+    def getall(self, key, default=None):
+        if key in self:
+            return [self[key]]
+        return default if default is not None else []
+
+
+class SimulatedResponse:
+    """Stand-in for an aiohttp response"""
+
+    def __init__(self, status, body='', headers=None):
+        self.status = status
+        self.charset = 'utf-8'
+        self.headers = SimulatedHeaders(headers or {})
+        self._body = body
+
+    async def text(self):
+        return self._body
+
+    async def read(self):
+        return self._body.encode('utf-8')
+
+
+class _SimulatedRequest:
+    """Async context manager returned by SimulatedSession.get/post"""
+
+    def __init__(self, handler):
+        self._handler = handler
+
+    async def __aenter__(self):
+        return await self._handler()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class SimulatedSession:
+    """
+    Stand-in for the aiohttp session that serves product pages from a scenario timeline.
+
+    Args:
+        scenario (dict): Scenario being simulated
+        clock (VirtualClock): Clock the simulation runs on
+        rng (random.Random): Seeded generator for latency and errors
+        latency (float): Mean seconds per request
+        error_rate (float): Fraction of requests answered with an error status
+        block_rate (float): Fraction of requests answered with 429 (rate limited)
+    """
+
+    def __init__(self, scenario, clock, rng, latency=0.4, error_rate=0.0, block_rate=0.0):
+        self.clock = clock
+        self.rng = rng
+        self.latency = latency
+        self.error_rate = error_rate
+        self.block_rate = block_rate
+        self.start = scenario['start']
+        self.windows = {}
+        for product in scenario['products']:
+            self.windows[product['sku_id']] = (
+                [w[0] for w in product['windows']],
+                [w[1] for w in product['windows']]
+            )
+
+        self.cookie_jar = []
+        self.requests = 0
+        self.notifications = []
+
+    def is_available(self, sku_id, timestamp):
+        """Return whether the scenario has a SKU in stock at an epoch timestamp"""
+        opens, closes = self.windows.get(sku_id, ([], []))
+        offset = timestamp - self.start
+        index = bisect.bisect_right(opens, offset) - 1
+        return index >= 0 and offset < closes[index]
+
+    async def _delay(self):
+        await asyncio.sleep(self.rng.expovariate(1.0 / self.latency) if self.latency else 0)
+
+    def get(self, url, headers=None, timeout=None, trace_request_ctx=None):
+        async def handler():
+            self.requests += 1
+            await self._delay()
+            roll = self.rng.random()
+            if roll < self.block_rate:
+                return SimulatedResponse(429)
+            if roll < self.block_rate + self.error_rate:
+                return SimulatedResponse(503, '<html><body>Service Unavailable</body></html>')
+
+            sku_id = url.split('skuId=')[1].split('&')[0] if 'skuId=' in url else None
+            # Availability is sampled when the server answers, not when the request was scheduled
+            template = IN_STOCK_HTML if self.is_available(sku_id, self.clock.time()) else OUT_OF_STOCK_HTML
+            return SimulatedResponse(200, template.format(sku=sku_id))
+        return _SimulatedRequest(handler)
+
+    def post(self, url, json=None, timeout=None):
+        async def handler():
+            await self._delay()
+            self.notifications.append((self.clock.time(), (json or {}).get('content', '')))
+            return SimulatedResponse(204)
+        return _SimulatedRequest(handler)
+
+
+def _percentile(values, fraction):
+    """Return the nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(scenario, session):
+    """
+    Score a finished run against its scenario.
+
+    Returns:
+        dict: Detection latencies, missed windows, request and notification counts
+    """
+    latencies = []
+    missed = 0
+    for product in scenario['products']:
+        prefix = f"## {product['name']} is IN STOCK"
+        alerts = [t - scenario['start'] for t, content in session.notifications if content.startswith(prefix)]
+        for opens, closes in product['windows']:
+            detected = [t for t in alerts if opens <= t <= closes + DETECTION_GRACE]
+            if detected:
+                latencies.append(detected[0] - opens)
+            else:
+                missed += 1
+
+    hours = scenario['duration'] / 3600
+    return {
+        'windows': len(latencies) + missed,
+        'detected': len(latencies),
+        'missed': missed,
+        'latency_mean': statistics.mean(latencies) if latencies else None,
+        'latency_p50': _percentile(latencies, 0.5) if latencies else None,
+        'latency_p95': _percentile(latencies, 0.95) if latencies else None,
+        'latency_max': max(latencies) if latencies else None,
+        'requests': session.requests,
+        'requests_per_hour': session.requests / hours if hours else 0,
+        'notifications': len(session.notifications)
+    }
+
+
+def simulate(scenario, seed=1, latency=0.4, error_rate=0.0, block_rate=0.0, overrides=None, verbose=False,
+             trace_file=None):
+    """
+    Run the scanner once against a scenario on a virtual clock.
+
+    Args:
+        scenario (dict): Scenario to simulate
+        seed (int): Seed for all randomness in the run (jitter, user agents, latency, errors)
+        latency (float): Mean simulated seconds per request
+        error_rate (float): Fraction of requests answered with a 503
+        block_rate (float): Fraction of requests answered with a 429
+        overrides (dict): Settings to override for this run, e.g. {'DEFAULT_DELAY': 20}
+        verbose (bool): Show the scanner's console and log output
+        trace_file (str): Export check traces to this JSON-lines file and add the
+            tracer's detection-latency summary to the result as 'trace_summary'
+
+    Returns:
+        dict: Summary from summarize() plus 'wall_seconds'
+    """
+    random.seed(seed)
+    clock = VirtualClock(scenario['start'])
+    session = SimulatedSession(scenario, clock, random.Random(seed), latency, error_rate, block_rate)
+    products = {
+        product['name']: {'url': f"{SIM_BASE_URL}/site/simulated/{product['sku_id']}.p?skuId={product['sku_id']}"}
+        for product in scenario['products']
+    }
+
+    logger = logging.getLogger("stock_scanner")
+    previous_level = logger.level
+    if not verbose:
+        logger.setLevel(logging.CRITICAL)
+
+    started = perf_counter()
+    # Cookies, user agents and failure snapshots written during the run go to a scratch directory
+    with tempfile.TemporaryDirectory() as workdir:
+        config = make_config(**{
+            'RESTOCK_HISTORY_FILE': None,
+            'COOKIES_FILE': os.path.join(workdir, 'cookies.json'),
+            'USER_AGENTS_FILE': os.path.join(workdir, 'user_agents.json'),
+            'SNAPSHOT_DIR': os.path.join(workdir, 'snapshots'),
+            'ENABLE_TRACING': bool(trace_file),
+            'TRACE_FILE': os.path.abspath(trace_file) if trace_file else None,
+            'DISCORD_WEBHOOK_URL': SIM_WEBHOOK_URL,
+            **(overrides or {})
+        })
+        scanner = Scanner(
+            products,
+            config=config,
+            clock=clock,
+            fetcher=HttpFetcher(config, session=session),
+            notifier=DiscordNotifier(SIM_WEBHOOK_URL, clock=clock, timestamp_format=config.TIMESTAMP_FORMAT, session=session),
+            console=verbose
+        )
+        try:
+            run_virtual(scanner.run(until=clock.time() + scenario['duration']), clock)
+        finally:
+            logger.setLevel(previous_level)
+
+    result = summarize(scenario, session)
+    result['wall_seconds'] = perf_counter() - started
+    if scanner.tracer:
+        result['trace_summary'] = scanner.tracer.summary()
+    return result
+
+
+def _format_seconds(value):
+    return '-' if value is None else f"{value:.1f}s"
+
+
+def _parse_override(text):
+    """Parse NAME=VALUE into a (name, python value) pair"""
+    name, _, raw = text.partition('=')
+    try:
+        value = ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        value = raw
+    return name.strip(), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the scanner on a virtual clock against a scripted timeline")
+    parser.add_argument('--scenario', help="JSON scenario file (default: generate one)")
+    parser.add_argument('--products', type=int, default=5, help="Products in a generated scenario")
+    parser.add_argument('--days', type=int, default=7, help="Days in a generated scenario")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the first run (later runs use seed+1, seed+2, ...)")
+    parser.add_argument('--runs', type=int, default=1, help="Number of runs with consecutive seeds")
+    parser.add_argument('--latency', type=float, default=0.4, help="Mean simulated request latency (seconds)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--block-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help="Override a setting for the runs")
+    parser.add_argument('--save-scenario', help="Write the scenario used to this JSON file")
+    parser.add_argument('--trace', metavar='FILE', help="Export check traces to FILE and report detection-latency SLO compliance")
+    parser.add_argument('--verbose', action='store_true', help="Show the scanner's own output")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario) if args.scenario else generate_scenario(args.products, args.days, args.seed)
+    if args.save_scenario:
+        with open(args.save_scenario, 'w') as f:
+            json.dump(scenario, f, indent=2)
+
+    overrides = dict(_parse_override(item) for item in args.set)
+    simulated_seconds = scenario['duration']
+    results = []
+    for run_index in range(args.runs):
+        result = simulate(scenario, args.seed + run_index, args.latency, args.error_rate,
+                          args.block_rate, overrides, args.verbose, args.trace)
+        results.append(result)
+        print(
+            f"run {run_index + 1}: detected {result['detected']}/{result['windows']} "
+            f"latency mean {_format_seconds(result['latency_mean'])} "
+            f"p95 {_format_seconds(result['latency_p95'])} "
+            f"max {_format_seconds(result['latency_max'])} | "
+            f"{result['requests']} requests ({result['requests_per_hour']:.0f}/h) | "
+            f"{result['notifications']} notifications | "
+            f"{simulated_seconds / result['wall_seconds']:.0f}x real time"
+        )
+        trace_summary = result.get('trace_summary')
+        if trace_summary:
+            for product, stats in trace_summary['products'].items():
+                print(f"  {product}: p95 {_format_seconds(stats['p95'])}, "
+                      f"{stats['slo_compliance']:.0%} within {trace_summary['slo']}s SLO")
+            slowest = sorted(trace_summary['stages'].items(), key=lambda item: -item[1]['mean'])[:3]
+            print("  slowest stages: " + ', '.join(f"{name} {stats['mean']:.2f}s" for name, stats in slowest))
+
+    if len(results) > 1:
+        latencies = [r['latency_mean'] for r in results if r['latency_mean'] is not None]
+        print(
+            f"\n{len(results)} runs: detected {sum(r['detected'] for r in results)}/{sum(r['windows'] for r in results)} "
+            f"mean latency {_format_seconds(statistics.mean(latencies) if latencies else None)} | "
+            f"mean requests {statistics.mean(r['requests'] for r in results):.0f} | "
+            f"mean notifications {statistics.mean(r['notifications'] for r in results):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
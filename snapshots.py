@@ -0,0 +1,254 @@
+"""
+Failure Snapshots
+
+Bounded on-disk ring buffer of raw responses kept for debugging failed
+checks. Each snapshot is a single compressed file holding a JSON metadata
+line (product, URL, status, headers, reason, ...) followed by the raw
+response body. Snapshots are compressed and written by a background thread,
+so a burst of failures never blocks the scanning loop; when the writer falls
+behind, new snapshots are dropped rather than queued without limit. The
+oldest snapshots are deleted once the count or size limit is exceeded.
+
+zstd compression is used when the optional zstandard package is installed,
+gzip otherwise.
+
+Usage:
+    python snapshots.py list
+    python snapshots.py show 42
+    python snapshots.py extract 42 -o page.html
+"""
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger("stock_scanner")
+
+_FILE_PATTERN = re.compile(r'^(\d+)-.*\.snap\.(gz|zst)$')
+
+__all__ = ['SnapshotStore']
+
+
+def _slug(text):
+    """Return a filename-safe version of a product name"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_')[:40] or 'snapshot'
+
+
+def _zstandard():
+    """Return the optional zstandard module, or None if it is not installed"""
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _compress(data, compression):
+    if compression == 'zst':
+        return _zstandard().ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _open_decompressed(path):
+    """Open a snapshot file as a decompressed binary stream"""
+    if path.endswith('.zst'):
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst snapshots (pip install zstandard)")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return gzip.open(path, 'rb')
+
+
+class SnapshotStore:
+    """
+    Ring buffer of compressed response snapshots.
+
+    Args:
+        directory (str): Directory the snapshots are kept in
+        max_count (int): Maximum number of snapshots kept
+        max_bytes (int): Maximum total size of the snapshots on disk
+        compression (str): 'zstd' or 'gzip' ('zstd' falls back to gzip if zstandard is missing)
+        queue_size (int): Snapshots waiting to be written before new ones are dropped
+    """
+
+    def __init__(self, directory='snapshots', max_count=50, max_bytes=20 * 1024 * 1024,
+                 compression='zstd', queue_size=16):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self._suffix = None  # Resolved by the writer thread, so zstandard is only imported when needed
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._index = None  # [(id, path, size), ...] oldest first, loaded by the writer thread
+        self._next_id = 1
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """Return (id, path, size) for every snapshot on disk, oldest first"""
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for name in os.listdir(self.directory):
+            match = _FILE_PATTERN.match(name)
+            if match:
+                path = os.path.join(self.directory, name)
+                found.append((int(match.group(1)), path, os.path.getsize(path)))
+        found.sort()
+        return found
+
+    def find(self, snapshot_id):
+        """Return the path of a snapshot by id, or None"""
+        for entry_id, path, _ in self.entries():
+            if entry_id == snapshot_id:
+                return path
+        return None
+
+    @staticmethod
+    def read(path):
+        """
+        Read a snapshot file.
+
+        Returns:
+            tuple: (metadata dict, raw body bytes)
+        """
+        with _open_decompressed(path) as f:
+            metadata = json.loads(f.readline().decode('utf-8'))
+            return metadata, f.read()
+
+    @staticmethod
+    def read_metadata(path):
+        """Read only the metadata line of a snapshot file"""
+        with _open_decompressed(path) as f:
+            return json.loads(f.readline().decode('utf-8'))
+
+    def submit(self, body, **metadata):
+        """
+        Queue a snapshot for the background writer without blocking.
+
+        Args:
+            body (bytes): Raw response body
+            **metadata: JSON-serialisable details (product, url, status, headers, reason, ...)
+
+        Returns:
+            bool: False if the writer is behind and the snapshot was dropped
+        """
+        self._ensure_writer()
+        metadata.setdefault('captured_at', time.time())
+        try:
+            self._queue.put_nowait((body or b'', metadata))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout=5):
+        """Write out queued snapshots and stop the background writer"""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer is None:
+            return
+        self._queue.put(None)
+        writer.join(timeout)
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"Could not save failure snapshot: {e}")
+
+    def _write(self, body, metadata):
+        if self._index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._index = self.entries()
+            self._next_id = self._index[-1][0] + 1 if self._index else 1
+
+        snapshot_id = self._next_id
+        self._next_id += 1
+        metadata['id'] = snapshot_id
+        payload = json.dumps(metadata).encode('utf-8') + b'\n' + body
+
+        if self._suffix is None:
+            self._suffix = 'zst' if self.compression == 'zstd' and _zstandard() is not None else 'gz'
+        name = f"{snapshot_id:06d}-{_slug(str(metadata.get('product', '')))}.snap.{self._suffix}"
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(_compress(payload, self._suffix))
+        self._index.append((snapshot_id, path, os.path.getsize(path)))
+        logger.info(f"Saved failure snapshot {snapshot_id} to {path}")
+
+        # Evict the oldest snapshots until both limits hold again
+        total = sum(size for _, _, size in self._index)
+        while self._index and (len(self._index) > self.max_count or total > self.max_bytes):
+            _, old_path, old_size = self._index.pop(0)
+            total -= old_size
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List and extract failure snapshots")
+    parser.add_argument('--dir', default=None, help="Snapshot directory (default: SNAPSHOT_DIR from settings)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="List snapshots, oldest first")
+    show = commands.add_parser('show', help="Print a snapshot's metadata")
+    show.add_argument('id', type=int)
+    extract = commands.add_parser('extract', help="Write a snapshot's raw body to a file")
+    extract.add_argument('id', type=int)
+    extract.add_argument('-o', '--output', help="Output file (default: snapshot_<id>.html)")
+    args = parser.parse_args()
+
+    directory = args.dir
+    if directory is None:
+        from settings import SNAPSHOT_DIR
+        directory = SNAPSHOT_DIR
+    store = SnapshotStore(directory)
+
+    if args.command == 'list':
+        entries = store.entries()
+        if not entries:
+            print(f"No snapshots in {directory}")
+        for snapshot_id, path, size in entries:
+            metadata = store.read_metadata(path)
+            captured = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(metadata.get('captured_at', 0)))
+            print(f"{snapshot_id:6d}  {captured}  {size:8d}B  {metadata.get('status', '-')}  "
+                  f"{metadata.get('page', '-'):<10}  {metadata.get('product', '')}  {metadata.get('reason', '')}")
+        return
+
+    path = store.find(args.id)
+    if path is None:
+        parser.error(f"No snapshot with id {args.id} in {directory}")
+    metadata, body = store.read(path)
+
+    if args.command == 'show':
+        print(json.dumps(metadata, indent=2))
+    else:
+        output = args.output or f"snapshot_{args.id}.html"
+        with open(output, 'wb') as f:
+            f.write(body)
+        print(f"Wrote {len(body)} bytes to {output}")
+
+
+if __name__ == "__main__":
+    main()
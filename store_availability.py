@@ -0,0 +1,236 @@
+"""
+In-Store Pickup Availability
+
+Checks pickup availability for every tracked SKU across a list of stores and
+ZIP codes. Queries are planned so request volume grows with the number of
+locations asked about, not with SKUs x stores:
+
+- Every SKU is asked about once per location, in batches of several SKUs
+  per request, even if several products share it.
+- A ZIP code query answers for all nearby stores at once. Stores that a
+  fresh ZIP answer already covered are not queried on their own.
+- Answers are cached per location for a TTL, so checking more often than
+  the TTL costs no requests.
+
+The result for each SKU is a bitmap over the stores seen so far (bit n set
+means store n has it for pickup). Only bits that flip are reported as
+transitions; a store whose answer failed or expired keeps its last known
+state instead of flipping.
+"""
+import asyncio
+import json
+import logging
+
+from tracing import NULL_TRACE
+from virtual_clock import SystemClock
+
+logger = logging.getLogger("stock_scanner")
+
+DEFAULT_ENDPOINT = 'https://www.bestbuy.com/productfulfillment/c/api/2.0/storeAvailability'
+
+__all__ = ['PickupChecker', 'parse_location']
+
+
+def parse_location(value):
+    """
+    Parse a configured pickup location.
+
+    Five-digit values are ZIP codes, anything else is a store ID.
+
+    Returns:
+        tuple: ('zip', code) or ('store', store_id)
+    """
+    value = str(value).strip()
+    if len(value) == 5 and value.isdigit():
+        return 'zip', value
+    return 'store', value
+
+
+class PickupChecker:
+    """
+    Batched multi-location pickup availability checker.
+
+    Args:
+        fetcher: Object with async post_json(url, payload, trace) -> FetchResult
+        locations (list): Store IDs and ZIP codes to check
+        endpoint (str): Store availability API URL
+        clock: Time source for the cache (SystemClock by default)
+        cache_ttl (float): Seconds a location's answer is reused
+        batch_size (int): SKUs asked about per request
+        concurrency (int): Requests in flight at once
+    """
+
+    def __init__(self, fetcher, locations, endpoint=DEFAULT_ENDPOINT, clock=None, cache_ttl=120,
+                 batch_size=10, concurrency=3):
+        self.fetcher = fetcher
+        self.locations = list(dict.fromkeys(parse_location(location) for location in locations))
+        self.endpoint = endpoint
+        self.clock = clock or SystemClock()
+        self.cache_ttl = cache_ttl
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+        self.store_ids = []  # Bit position -> store ID, in the order stores were first seen
+        self._bits = {}  # Store ID -> bit position
+        self.store_names = {}
+        self.bitmaps = {}  # SKU -> stores with pickup available
+        self._cache = {}  # Location -> {SKU: (expires, {store ID: pickup quantity})}
+        self._sources = {}  # Store ID -> locations whose answers have listed it
+        self.requests = 0
+        self.blocked = None  # Status of a 429/403 answer in the last check; stops the rest of its queries
+
+    # Bitmaps
+
+    def _bit(self, store_id):
+        if store_id not in self._bits:
+            self._bits[store_id] = len(self.store_ids)
+            self.store_ids.append(store_id)
+        return 1 << self._bits[store_id]
+
+    def stores_in(self, bitmap):
+        """Return the store IDs whose bits are set in a bitmap"""
+        return [store_id for index, store_id in enumerate(self.store_ids) if bitmap >> index & 1]
+
+    def available_stores(self, sku):
+        """Return the store IDs a SKU is currently available for pickup at"""
+        return self.stores_in(self.bitmaps.get(sku, 0))
+
+    def store_label(self, store_id):
+        name = self.store_names.get(store_id)
+        return f"{name} (#{store_id})" if name else f"#{store_id}"
+
+    def forget(self, sku):
+        """Drop a SKU that is no longer tracked"""
+        self.bitmaps.pop(sku, None)
+        for entries in self._cache.values():
+            entries.pop(sku, None)
+
+    # Querying
+
+    def _fresh(self, location, sku, now):
+        entry = self._cache.get(location, {}).get(sku)
+        return entry is not None and entry[0] > now
+
+    def _covered(self, store_id, sku, now):
+        """Return whether a fresh answer from another location already lists a store for a SKU"""
+        for location in self._sources.get(store_id, ()):
+            if self._fresh(location, sku, now) and store_id in self._cache[location][sku][1]:
+                return True
+        return False
+
+    def _payload(self, location, skus):
+        kind, value = location
+        payload = {
+            'items': [{'sku': sku, 'quantity': 1} for sku in skus],
+            'lookupInStoreQuantity': True,
+            'onlyBestBuyLocations': True
+        }
+        payload['zipCode' if kind == 'zip' else 'locationId'] = value
+        return payload
+
+    async def _query(self, location, skus, semaphore, trace):
+        """Ask one location about a batch of SKUs and cache the answer"""
+        async with semaphore:
+            if self.blocked:
+                return
+            self.requests += 1
+            try:
+                response = await self.fetcher.post_json(self.endpoint, self._payload(location, skus), trace)
+                if response.status in (403, 429):
+                    self.blocked = response.status
+                    return
+                if response.status != 200:
+                    raise ValueError(f"HTTP {response.status}")
+                data = json.loads(response.body.decode(response.charset or 'utf-8')).get('ispu', {})
+            except Exception as e:
+                logger.warning(f"Pickup availability query for {location[0]} {location[1]} failed: {e}")
+                return
+
+        for store in data.get('locations', []):
+            if store.get('id') and store.get('name'):
+                self.store_names[str(store['id'])] = store['name']
+
+        answers = {sku: {} for sku in skus}
+        for item in data.get('items', []):
+            sku = str(item.get('sku'))
+            if sku not in answers:
+                continue
+            for store in item.get('locations', []):
+                store_id = str(store.get('locationId'))
+                answers[sku][store_id] = store.get('availability', {}).get('availablePickupQuantity', 0) or 0
+                self._sources.setdefault(store_id, set()).add(location)
+
+        expires = self.clock.time() + self.cache_ttl
+        entries = self._cache.setdefault(location, {})
+        for sku, stores in answers.items():
+            entries[sku] = (expires, stores)
+
+    async def _refresh(self, pending, trace):
+        """Run the queries for {location: [SKU, ...]} in batches of batch_size SKUs"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queries = []
+        for location, skus in pending.items():
+            for i in range(0, len(skus), self.batch_size):
+                queries.append(self._query(location, skus[i:i + self.batch_size], semaphore, trace))
+        if queries:
+            await asyncio.gather(*queries)
+
+    async def check(self, skus, trace=NULL_TRACE):
+        """
+        Refresh pickup availability for a set of SKUs.
+
+        Args:
+            skus (list): SKUs to check (duplicates are asked about once)
+            trace (CheckTrace): Trace the requests are recorded on
+
+        Returns:
+            list: (sku, [store IDs that became available], [store IDs that sold out]) per changed SKU.
+            If the endpoint answers 429/403 the remaining queries are skipped and
+            `blocked` holds the status; stores without a fresh answer keep their state.
+        """
+        self.blocked = None
+        skus = list(dict.fromkeys(sku for sku in skus if sku))
+        now = self.clock.time()
+
+        # ZIP codes first: each answer covers many stores
+        await self._refresh({
+            location: [sku for sku in skus if not self._fresh(location, sku, now)]
+            for location in self.locations if location[0] == 'zip'
+        }, trace)
+
+        now = self.clock.time()
+        await self._refresh({
+            location: [sku for sku in skus if not self._fresh(location, sku, now) and not self._covered(location[1], sku, now)]
+            for location in self.locations if location[0] == 'store'
+        }, trace)
+
+        now = self.clock.time()
+        transitions = []
+        for sku in skus:
+            old = self.bitmaps.get(sku, 0)
+            bitmap = self._merge(sku, old, now)
+            self.bitmaps[sku] = bitmap
+            if bitmap != old:
+                transitions.append((sku, self.stores_in(bitmap & ~old), self.stores_in(old & ~bitmap)))
+        return transitions
+
+    def _merge(self, sku, bitmap, now):
+        """Apply every fresh answer for a SKU to its previous bitmap"""
+        available = {}
+        for location, entries in self._cache.items():
+            if not self._fresh(location, sku, now):
+                continue
+            stores = entries[sku][1]
+            for store_id, quantity in stores.items():
+                available[store_id] = available.get(store_id, False) or quantity > 0
+            # A store this location used to list but no longer does has nothing for pickup
+            for store_id, sources in self._sources.items():
+                if location in sources and store_id not in stores:
+                    available.setdefault(store_id, False)
+
+        for store_id, is_available in available.items():
+            if is_available:
+                bitmap |= self._bit(store_id)
+            elif store_id in self._bits:
+                bitmap &= ~self._bit(store_id)
+        return bitmap
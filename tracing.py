@@ -0,0 +1,311 @@
+"""
+Detection Latency Tracing
+
+Every check carries a CheckTrace that records, on a monotonic clock, how long
+it waited to be dispatched, each phase of the fetch, parsing, the stock
+transition and the Discord webhook round trip. Finished traces are exported
+as JSON lines and folded into a per-product detection-latency summary that is
+checked against an SLO.
+"""
+import json
+import logging
+from itertools import count
+
+logger = logging.getLogger("stock_scanner")
+
+__all__ = ['Tracer', 'CheckTrace', 'NULL_TRACE']
+
+
+class _Span:
+    """Context manager that times one named span of a trace"""
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.trace.clock.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.trace.add_span(self.name, self.start, self.trace.clock.monotonic(), **self.attrs)
+        return False
+
+
+class CheckTrace:
+    """
+    Timing record for a single product check.
+
+    Args:
+        tracer (Tracer): Tracer the finished trace is reported to
+        trace_id (int): Sequential id of the check
+        product_name (str): Product being checked
+        due (float): Monotonic time the check was due
+        queued (float): Monotonic time the scheduler queued the check
+    """
+
+    def __init__(self, tracer, trace_id, product_name, due, queued):
+        self.tracer = tracer
+        self.clock = tracer.clock
+        self.trace_id = trace_id
+        self.product_name = product_name
+        self.wall_time = self.clock.time()
+        self.due = due
+        self.queued = queued
+        self.dispatched = None
+        self.spans = []
+        self.events = {}
+        self.attrs = {}
+
+    def add_span(self, name, start, end, **attrs):
+        """Record a span with explicit monotonic start and end times"""
+        self.spans.append({'name': name, 'start': start, 'end': end, 'duration': end - start, **attrs})
+
+    def span(self, name, **attrs):
+        """Return a context manager that records the enclosed block as a span"""
+        return _Span(self, name, attrs)
+
+    def mark(self, name):
+        """Record the monotonic time of a point event (the first occurrence wins)"""
+        self.events.setdefault(name, self.clock.monotonic())
+
+    def dispatch(self):
+        """Record that the check has left the scheduler queue and started running"""
+        self.dispatched = self.clock.monotonic()
+        self.add_span('queue_wait', self.queued, self.dispatched)
+
+    def set(self, **attrs):
+        """Attach attributes (status, outcome, ...) to the trace"""
+        self.attrs.update(attrs)
+
+    def finish(self):
+        """Close the trace and hand it to the tracer"""
+        self.tracer.finish(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'product': self.product_name,
+            'wall_time': self.wall_time,
+            'due': self.due,
+            'queued': self.queued,
+            'dispatched': self.dispatched,
+            'schedule_lag': self.queued - self.due,
+            'finished': self.clock.monotonic(),
+            'spans': self.spans,
+            'events': self.events,
+            **self.attrs
+        }
+
+
+class _NullTrace:
+    """Trace that records nothing, used when tracing is disabled"""
+
+    class _NullSpan:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            return False
+
+    _null_span = _NullSpan()
+
+    def add_span(self, name, start, end, **attrs):
+        pass
+
+    def span(self, name, **attrs):
+        return self._null_span
+
+    def mark(self, name):
+        pass
+
+    def dispatch(self):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Tracer:
+    """
+    Creates check traces, exports them and tracks detection latency per product.
+
+    Detection latency is measured from the last check that still saw a product
+    out of stock (the latest moment it can have become purchasable) to the
+    webhook acknowledgement of the in-stock alert, so it is an upper bound.
+
+    Args:
+        clock: Clock providing time() and monotonic()
+        export_file (str): JSON-lines file finished traces are appended to (None to skip export)
+        slo (float): Detection-latency objective in seconds
+    """
+
+    def __init__(self, clock, export_file=None, slo=60):
+        self.clock = clock
+        self.export_file = export_file
+        self.slo = slo
+        self._ids = count(1)
+        self._export = None
+        # product -> monotonic dispatch time of the last check that saw it out of stock
+        self._last_out_of_stock = {}
+        # product -> [detection latency, ...]
+        self.detections = {}
+        # product -> restocks whose alert Discord never acknowledged
+        self.failed_deliveries = {}
+        # span name -> [count, total duration, max duration] over all finished traces
+        self.stage_durations = {}
+
+    def start_check(self, product_name, due):
+        """
+        Start a trace for a check the scheduler is queueing now.
+
+        Args:
+            product_name (str): Product being checked
+            due (float): Epoch seconds at which the check was due (None for a first check, due when queued)
+
+        Returns:
+            CheckTrace: The new trace
+        """
+        queued = self.clock.monotonic()
+        due_monotonic = queued if due is None else queued - max(0.0, self.clock.time() - due)
+        return CheckTrace(self, next(self._ids), product_name, due_monotonic, queued)
+
+    def finish(self, trace):
+        """Fold a finished trace into the detection statistics and export it"""
+        record = trace.to_dict()
+        product = trace.product_name
+        outcome = record.get('outcome')
+
+        if outcome in ('out_of_stock', 'sold_out') and trace.dispatched is not None:
+            self._last_out_of_stock[product] = trace.dispatched
+        elif outcome == 'restock':
+            acked = trace.events.get('webhook_ack')
+            last_seen_out = self._last_out_of_stock.get(product, trace.dispatched)
+            if acked is None:
+                # The alert never reached Discord, so the restock was not detected in any useful sense
+                record['delivered'] = False
+                record['slo_met'] = False
+                self.failed_deliveries[product] = self.failed_deliveries.get(product, 0) + 1
+                logger.warning(f"{product} restock alert was not delivered")
+            elif last_seen_out is not None:
+                latency = acked - last_seen_out
+                record['detection_latency'] = latency
+                record['slo_met'] = latency <= self.slo
+                self.detections.setdefault(product, []).append(latency)
+                logger.info(f"{product} detected within {latency:.1f}s of the last out-of-stock check (SLO {self.slo}s)")
+
+        for span in trace.spans:
+            stage = self.stage_durations.setdefault(span['name'], [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += span['duration']
+            stage[2] = max(stage[2], span['duration'])
+
+        self._write(record)
+
+    def _write(self, record):
+        if not self.export_file:
+            return
+        try:
+            if self._export is None:
+                self._export = open(self.export_file, 'a', encoding='utf-8')
+            self._export.write(json.dumps(record) + '\n')
+            self._export.flush()
+        except Exception as e:
+            logger.error(f"Error exporting trace: {e}")
+
+    def close(self):
+        """Close the export file"""
+        if self._export is not None:
+            self._export.close()
+            self._export = None
+
+    def summary(self):
+        """
+        Summarize detection latency per product and time spent per stage.
+
+        Returns:
+            dict: 'slo', 'products' (per-product detections, failed deliveries,
+            percentiles and SLO compliance) and 'stages' (mean and max duration
+            per span name). Undelivered alerts count against SLO compliance;
+            the percentiles are None for a product with no delivered alert.
+        """
+        products = {}
+        for product in list(self.detections) + [p for p in self.failed_deliveries if p not in self.detections]:
+            ordered = sorted(self.detections.get(product, []))
+            failed = self.failed_deliveries.get(product, 0)
+            products[product] = {
+                'detections': len(ordered),
+                'failed_deliveries': failed,
+                'p50': ordered[len(ordered) // 2] if ordered else None,
+                'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else None,
+                'max': ordered[-1] if ordered else None,
+                'slo_compliance': sum(1 for latency in ordered if latency <= self.slo) / (len(ordered) + failed)
+            }
+
+        stages = {
+            name: {'count': stage_count, 'mean': total / stage_count, 'max': longest}
+            for name, (stage_count, total, longest) in self.stage_durations.items()
+        }
+        return {'slo': self.slo, 'products': products, 'stages': stages}
+
+    def log_summary(self):
+        """Log the detection-latency summary"""
+        summary = self.summary()
+        for product, stats in summary['products'].items():
+            if not stats['detections']:
+                logger.info(f"{product}: {stats['failed_deliveries']} undelivered alerts, 0% within {self.slo}s")
+                continue
+            logger.info(
+                f"{product}: {stats['detections']} detections, p50 {stats['p50']:.1f}s, "
+                f"p95 {stats['p95']:.1f}s, {stats['slo_compliance']:.0%} within {self.slo}s"
+                + (f", {stats['failed_deliveries']} undelivered" if stats['failed_deliveries'] else "")
+            )
+        for name, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['mean']):
+            logger.info(f"  stage {name}: mean {stats['mean'] * 1000:.0f}ms, max {stats['max'] * 1000:.0f}ms over {stats['count']}")
+
+    def trace_config(self):
+        """
+        Build an aiohttp TraceConfig that records connection and transfer phases.
+
+        Requests opt in by passing trace_request_ctx={'trace': CheckTrace}.
+        """
+        import aiohttp
+
+        def _phase(name):
+            async def on_start(session, context, params):
+                trace = (context.trace_request_ctx or {}).get('trace')
+                if trace is not None:
+                    context.phase_starts = getattr(context, 'phase_starts', {})
+                    context.phase_starts[name] = self.clock.monotonic()
+
+            async def on_end(session, context, params):
+                trace = (context.trace_request_ctx or {}).get('trace')
+                started = getattr(context, 'phase_starts', {}).get(name)
+                if trace is not None and started is not None:
+                    trace.add_span(name, started, self.clock.monotonic())
+            return on_start, on_end
+
+        config = aiohttp.TraceConfig()
+        queued_start, queued_end = _phase('connection_queued')
+        dns_start, dns_end = _phase('dns')
+        connect_start, connect_end = _phase('connect')
+        request_start, request_end = _phase('headers')
+        config.on_connection_queued_start.append(queued_start)
+        config.on_connection_queued_end.append(queued_end)
+        config.on_dns_resolvehost_start.append(dns_start)
+        config.on_dns_resolvehost_end.append(dns_end)
+        config.on_connection_create_start.append(connect_start)
+        config.on_connection_create_end.append(connect_end)
+        config.on_request_start.append(request_start)
+        config.on_request_end.append(request_end)
+        return config
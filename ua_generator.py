@@ -128,14 +128,16 @@ def generate_chrome_ua(use_mobile=False):
     chrome_version = _get_chrome_version()
     os_string = random.choice(MOBILE_OS) if use_mobile else random.choice(WINDOWS_OS + MAC_OS + LINUX_OS)
 
-    # Format the OS string
-    if "Mac OS X" in os_string:
+    # Format the OS string (iOS strings also contain "Mac OS X", so check them first)
+    if "iPhone" in os_string or "iPad" in os_string:
+        os_string = os_string.format(ios_version=_get_ios_version())
+    elif "Mac OS X" in os_string:
         mac_minor, mac_patch = _get_mac_versions()
         os_string = os_string.format(mac_minor=mac_minor, mac_patch=mac_patch)
-    elif "iPhone" in os_string or "iPad" in os_string:
-        os_string = os_string.format(ios_version=_get_ios_version())
     elif "Android" in os_string:
         os_string = os_string.format(android_version=_get_android_version())
+    elif "rv:" in os_string:
+        os_string = os_string.format(firefox_version=_get_firefox_version())
     
     # Extras for Chrome
     extras = [""]
@@ -154,12 +156,12 @@ def generate_firefox_ua(use_mobile=False):
     firefox_version = _get_firefox_version()
     os_string = random.choice(MOBILE_OS) if use_mobile else random.choice(WINDOWS_OS + MAC_OS + LINUX_OS)
     
-    # Format the OS string
-    if "Mac OS X" in os_string:
+    # Format the OS string (iOS strings also contain "Mac OS X", so check them first)
+    if "iPhone" in os_string or "iPad" in os_string:
+        os_string = os_string.format(ios_version=_get_ios_version())
+    elif "Mac OS X" in os_string:
         mac_minor, mac_patch = _get_mac_versions()
         os_string = os_string.format(mac_minor=mac_minor, mac_patch=mac_patch)
-    elif "iPhone" in os_string or "iPad" in os_string:
-        os_string = os_string.format(ios_version=_get_ios_version())
     elif "Android" in os_string:
         os_string = os_string.format(android_version=_get_android_version())
     elif "rv:" in os_string:
@@ -215,6 +217,8 @@ def generate_opera_ua():
     if "Mac OS X" in os_string:
         mac_minor, mac_patch = _get_mac_versions()
         os_string = os_string.format(mac_minor=mac_minor, mac_patch=mac_patch)
+    elif "rv:" in os_string:
+        os_string = os_string.format(firefox_version=_get_firefox_version())
     
     return OPERA_PATTERN.format(
         os=os_string,
@@ -231,6 +235,8 @@ def generate_brave_ua():
     if "Mac OS X" in os_string:
         mac_minor, mac_patch = _get_mac_versions()
         os_string = os_string.format(mac_minor=mac_minor, mac_patch=mac_patch)
+    elif "rv:" in os_string:
+        os_string = os_string.format(firefox_version=_get_firefox_version())
     
     return BRAVE_PATTERN.format(
         os=os_string,
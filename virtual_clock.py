@@ -0,0 +1,113 @@
+"""
+Virtual Clock
+
+Clock sources used by the scanner. SystemClock reads the real wall clock;
+VirtualClock together with VirtualEventLoop lets the unmodified scheduler run
+against simulated time, where every asyncio.sleep (and every other timer on
+the loop) completes instantly and moves the clock forward instead of waiting.
+"""
+import asyncio
+import selectors
+import time as _time
+from datetime import datetime
+
+__all__ = ['SystemClock', 'VirtualClock', 'VirtualEventLoop', 'run_virtual']
+
+
+class SystemClock:
+    """Wall-clock time source used in normal operation"""
+
+    def time(self):
+        """Return epoch seconds"""
+        return _time.time()
+
+    def now(self):
+        """Return the current local datetime"""
+        return datetime.now()
+
+    def monotonic(self):
+        """Return seconds on a clock that never goes backwards"""
+        return _time.monotonic()
+
+
+class VirtualClock:
+    """
+    Simulated time source that only moves when the event loop has nothing to do.
+
+    Args:
+        start (float): Epoch seconds the simulation starts at (defaults to now)
+    """
+
+    def __init__(self, start=None):
+        self.start = _time.time() if start is None else start
+        self.elapsed = 0.0
+
+    def advance(self, seconds):
+        """Move the clock forward"""
+        if seconds > 0:
+            self.elapsed += seconds
+
+    def time(self):
+        """Return simulated epoch seconds"""
+        return self.start + self.elapsed
+
+    def now(self):
+        """Return the simulated local datetime"""
+        return datetime.fromtimestamp(self.time())
+
+    def monotonic(self):
+        """Return simulated seconds since the simulation started"""
+        return self.elapsed
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Selector that polls real file descriptors without blocking and skips idle time on the virtual clock"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready:
+            return ready
+        if timeout is None:
+            raise RuntimeError("Simulation stalled: no timers are scheduled and nothing is ready")
+        self.clock.advance(timeout)
+        return []
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose timers run on a VirtualClock.
+
+    Args:
+        clock (VirtualClock): Clock the loop reads and advances
+    """
+
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.monotonic()
+
+
+def run_virtual(coro, clock):
+    """
+    Run a coroutine to completion on a VirtualEventLoop.
+
+    Args:
+        coro: Coroutine to run
+        clock (VirtualClock): Clock the loop should drive
+
+    Returns:
+        The coroutine's result
+    """
+    loop = VirtualEventLoop(clock)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()